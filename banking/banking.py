@@ -1,28 +1,23 @@
-from banking.banking_controller import MainMenuController, LoggedInController
-from banking.banking_view import Displayer, Retriever
+import argparse
+from banking.banking_controller import run_session
+from banking.banking_view import Displayer, Retriever, RecordingRetriever
 from banking.banking_model import CardFactory, CardDataBaseSqlite3, Logger
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', help="append this session's inputs to a JSON lines file")
+    args, _ = parser.parse_known_args()
+
     displayer = Displayer()
-    retriever = Retriever(input)
+    retriever = Retriever(input) if args.record is None else RecordingRetriever(input, args.record)
     card_data_base = CardDataBaseSqlite3()
 
     logger = Logger(card_data_base)
     card_factory = CardFactory(card_data_base)
 
-    main_menu = MainMenuController(displayer, retriever, card_factory, logger)
-    keep_going = True
-    while keep_going:
-        logged_in_card = main_menu.main_loop()
-        if main_menu.is_over:
-            keep_going = False
-            break
-
-        logged_in_menu = LoggedInController(displayer, retriever, logged_in_card, card_data_base, card_factory)
-        logged_in_menu.main_loop()
-        if logged_in_menu.is_over:
-            keep_going = False
-            break
-
-
+    try:
+        run_session(displayer, retriever, card_data_base, card_factory, logger)
+    finally:
+        if args.record is not None:
+            retriever.save()
@@ -1,3 +1,4 @@
+import asyncio
 from banking.banking_model import Logger, CardFactory, CardDataBaseSqlite3, Card
 
 
@@ -6,50 +7,122 @@ class Controller:
         self.displayer = diplayer
         self.retriever = retriever
         self.choices = ['choice 1', 'choise 2']
+        self.actions = {}
 
-    def witch_choices(self):
+    def choices_message(self):
         message = ''
         for choice in self.choices:
             message += '\n' + choice
 
-        return self.retriever.retrieve(message)
+        return message
+
+    def witch_choices(self):
+        return self.retriever.retrieve(self.choices_message())
+
+    def main_loop(self):
+        # Each action returns True once the menu should be left; unknown
+        # choices simply ask again.
+        while True:
+            action = self.actions.get(self.witch_choices())
+            if action is not None and self.perform(action()):
+                return
+
+    # call runs the blocking steps. It has no default: a sqlite connection only
+    # works on the thread that opened it, which only the caller knows.
+    async def main_loop_async(self, call):
+        while True:
+            user_choice = await self.perform_step_async(call, self.retriever.retrieve, self.choices_message())
+            action = self.actions.get(user_choice)
+            if action is not None and await self.perform_async(action(), call):
+                return
+
+    # Actions are generators yielding a (function, *arguments) step for every
+    # input, output and database call, so the blocking loop and the asyncio
+    # loop share the same menu logic. A step's result, or its exception, is
+    # sent back into the action.
+    def perform(self, steps):
+        result, error = None, None
+        while True:
+            try:
+                step = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+
+            function, *arguments = step
+            result, error = None, None
+            try:
+                result = function(*arguments)
+            except Exception as exception:
+                error = exception
+
+    async def perform_async(self, steps, call):
+        result, error = None, None
+        while True:
+            try:
+                step = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+
+            function, *arguments = step
+            result, error = None, None
+            try:
+                result = await self.perform_step_async(call, function, *arguments)
+            except Exception as exception:
+                error = exception
+
+    async def perform_step_async(self, call, function, *arguments):
+        # Async displayers and retrievers are awaited, blocking calls (the
+        # database) are handed to call, which runs them off the event loop.
+        if asyncio.iscoroutinefunction(function):
+            return await function(*arguments)
+
+        return await call(function, *arguments)
 
 
 class MainMenuController(Controller):
     def __init__(self, displayer, retriever, card_factory, logger):
         super().__init__(displayer, retriever)
         self.choices = ['1. Create an account', '2. Log into account', '0. Exit']
+        self.actions = {'1': self.on_create_account, '2': self.on_log_in, '0': self.on_exit}
         self.is_over = False
         self.card_factory = card_factory
         self.logger = logger
+        self.logged_in_card = None
 
     def main_loop(self):
-        user_choice = self.witch_choices()
-        if user_choice == '0':
-            self.is_over = True
-            self.displayer.display("Bye!")
-            return
-
-        if user_choice == '1':
-            self.create_account()
-            return self.main_loop()
-
-        if user_choice == '2':
-            number = int(self.retriever.retrieve("\nEnter your card number:"))
-            pin = int(self.retriever.retrieve("\nEnter your PIN:"))
-            try:
-                card = self.logger.log_to(number, pin)
-                self.displayer.display("\nYou have successfully logged in!")
-                return card
-            except ValueError:
-                self.displayer.display("\nWrong card number or PIN!")
-                return self.main_loop()
-
-        self.main_loop()
+        self.logged_in_card = None
+        super().main_loop()
+        return self.logged_in_card
+
+    async def main_loop_async(self, call):
+        self.logged_in_card = None
+        await super().main_loop_async(call)
+        return self.logged_in_card
+
+    def on_exit(self):
+        self.is_over = True
+        yield self.displayer.display, "Bye!"
+        return True
+
+    def on_create_account(self):
+        yield from self.create_account()
+        return False
+
+    def on_log_in(self):
+        number = int((yield self.retriever.retrieve, "\nEnter your card number:"))
+        pin = int((yield self.retriever.retrieve, "\nEnter your PIN:"))
+        try:
+            self.logged_in_card = yield self.logger.log_to, number, pin
+        except ValueError:
+            yield self.displayer.display, "\nWrong card number or PIN!"
+            return False
+
+        yield self.displayer.display, "\nYou have successfully logged in!"
+        return True
 
     def create_account(self):
-        card = self.card_factory.new_card()
-        self.displayer.display(
+        card = yield self.card_factory.new_card,
+        yield self.displayer.display, (
             f"\nYour card have been created\n" +
             f"Your card number:\n" +
             f"{card.number}\n" +
@@ -63,56 +136,90 @@ class LoggedInController(Controller):
     def __init__(self, displayer, retriever, card, card_data_base, card_factory):
         super().__init__(displayer, retriever)
         self.choices = ['1. Balance', '2. Add income', '3. Do transfer', '4. Close account', '5. Log out', '0. Exit']
+        self.actions = {
+            '1': self.on_balance,
+            '2': self.on_add_income,
+            '3': self.on_transfer,
+            '4': self.on_close_account,
+            '5': self.on_log_out,
+            '0': self.on_exit,
+        }
         self.is_over = False
         self.card = card
         self.card_data_base = card_data_base
         self.card_factory = card_factory
 
-    def main_loop(self):
-        user_choice = self.witch_choices()
-        if user_choice == '0':
-            self.is_over = True
-            self.displayer.display("Bye!")
-            return
-
-        if user_choice == '1':
-            self.displayer.display(f"\nBalance: {self.card.account.balance}")
+    def on_exit(self):
+        self.is_over = True
+        yield self.displayer.display, "Bye!"
+        return True
+
+    def on_balance(self):
+        yield self.displayer.display, f"\nBalance: {self.card.account.balance}"
+        return False
+
+    def on_add_income(self):
+        income = int((yield self.retriever.retrieve, "\nEnter income:"))
+        self.card.account.balance = yield self.card_data_base.deposit, self.card.number, income
+        yield self.displayer.display, "Income was added!"
+        return False
+
+    def on_transfer(self):
+        yield self.displayer.display, "\nTransfer"
+        number = int((yield self.retriever.retrieve, "Enter card number:"))
+        if not self.card_factory.is_valid(number):
+            yield self.displayer.display, "Probably you made a mistake in the card number. Please try again!"
+            return False
+
+        try:
+            target_card = yield self.card_data_base.get_card, number
+        except ValueError:
+            yield self.displayer.display, "Such a card does not exist."
+            return False
+
+        amount_to_transfer = int((yield self.retriever.retrieve, "Enter how much money you want to transfer:"))
+        try:
+            balance = yield self.card_data_base.transfer, self.card.number, target_card.number, amount_to_transfer
+        except ValueError:
+            yield self.displayer.display, "Not enough money!"
+            return False
+
+        self.card.account.balance = balance
+        yield self.displayer.display, "Success!"
+        return False
+
+    def on_close_account(self):
+        yield self.displayer.display, "\nThe account has been closed!"
+        yield self.card_data_base.remove_card, self.card
+        return True
+
+    def on_log_out(self):
+        yield self.displayer.display, "\nYou have successfully logged out!"
+        self.is_over = False
+        return True
 
-        if user_choice == '2':
-            income = int(self.retriever.retrieve("\nEnter income:"))
-            self.card.account.deposit(income)
-            self.card_data_base.update_card(self.card)
-            self.displayer.display("Income was added!")
 
-        if user_choice == '3':
-            self.displayer.display("\nTransfer")
-            number = int(self.retriever.retrieve("Enter card number:"))
-            if not self.card_factory.is_valid(number):
-                self.displayer.display("Probably you made a mistake in the card number. Please try again!")
-                return self.main_loop()
+def run_session(displayer, retriever, card_data_base, card_factory, logger):
+    main_menu = MainMenuController(displayer, retriever, card_factory, logger)
+    while True:
+        logged_in_card = main_menu.main_loop()
+        if main_menu.is_over:
+            return
 
-            try:
-                target_card = self.card_data_base.get_card(number)
-                amount_to_transfer = int(self.retriever.retrieve("Enter how much money you want to transfer:"))
-                self.displayer.display("Success!")
-                try:
-                    self.card.account.withdraw(amount_to_transfer)
-                    target_card.account.deposit(amount_to_transfer)
-                except ValueError:
-                    self.displayer.display("Not enough money!")
-                self.card_data_base.update_card(self.card)
-                self.card_data_base.update_card(target_card)
-            except ValueError:
-                self.displayer.display("Such a card does not exist.")
-
-        if user_choice == '4':
-            self.displayer.display("\nThe account has been closed!")
-            self.card_data_base.remove_card(self.card)
+        logged_in_menu = LoggedInController(displayer, retriever, logged_in_card, card_data_base, card_factory)
+        logged_in_menu.main_loop()
+        if logged_in_menu.is_over:
             return
 
-        if user_choice == '5':
-            self.displayer.display("\nYou have successfully logged out!")
-            self.is_over = False
+
+async def run_session_async(displayer, retriever, card_data_base, card_factory, logger, call):
+    main_menu = MainMenuController(displayer, retriever, card_factory, logger)
+    while True:
+        logged_in_card = await main_menu.main_loop_async(call)
+        if main_menu.is_over:
             return
 
-        self.main_loop()
\ No newline at end of file
+        logged_in_menu = LoggedInController(displayer, retriever, logged_in_card, card_data_base, card_factory)
+        await logged_in_menu.main_loop_async(call)
+        if logged_in_menu.is_over:
+            return
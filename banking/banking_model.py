@@ -1,84 +1,548 @@
+import array
+import bisect
+import collections
+import contextlib
+import csv
+import itertools
+import json
+import mmap
+import queue
 import random
 import sqlite3
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+
+PRAGMA_SETTINGS = ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store')
+
+PRAGMA_PROFILES = {
+    'default': {},
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+    },
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+# Snapshot files: a header (magic, byte order of the records, card count, number
+# of the last emitted card) followed by fixed-width (number, pin, balance)
+# records sorted by number, in the byte order of the machine that wrote them so
+# they can be read in place.
+SNAPSHOT_MAGIC = b'CARDSNP3'
+SNAPSHOT_HEADER = struct.Struct('<8s8sqq')
+
+
+DOUBLED_DIGITS = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+
+
+def build_luhn_table(double_units):
+    # Luhn sum of every 4-digit block. Blocks have an even width, so within a
+    # 16-digit card number every block doubles the same positions: the units
+    # and hundreds of a prefix (check digit not yet appended), or the tens and
+    # thousands of a full number.
+    table = []
+    for block in range(10_000):
+        total = 0
+        for position in range(4):
+            block, digit = divmod(block, 10)
+            if (position % 2 == 0) == double_units:
+                digit = DOUBLED_DIGITS[digit]
+            total += digit
+        table.append(total)
+
+    return table
+
+
+LUHN_PREFIX_TABLE = build_luhn_table(double_units=True)
+LUHN_NUMBER_TABLE = build_luhn_table(double_units=False)
 
 
 class CardDataBase:
     def __init__(self):
-        self.cards = []
+        self.cards = {}
+        # The card with the highest customer account number ever added. It is
+        # kept when that card is removed, so its number is never issued again.
+        self.last_emitted_card = None
+        # Held by CardFactory from reading the last emitted card until the
+        # next one is added, so threads sharing a database never pick the same number.
+        self.allocation_lock = threading.Lock()
 
     def add_card(self, card):
-        self.cards.append(card)
+        if card.number in self.cards:
+            raise ValueError("Card (number: {} ) already in database!".format(card.number))
+
+        self.cards[card.number] = card
+        self.advance_last_emitted_card(card)
+        return
+
+    def add_cards(self, cards):
+        cards = {card.number: card for card in cards}
+        if not self.cards.keys().isdisjoint(cards):
+            raise ValueError("Some cards are already in database!")
+
+        self.cards.update(cards)
+        for card in cards.values():
+            self.advance_last_emitted_card(card)
+        return
+
+    def advance_last_emitted_card(self, card):
+        last = self.last_emitted_card
+        if last is None or card.get_customer_account_number() >= last.get_customer_account_number():
+            self.last_emitted_card = card
+        return
+
+    def update_card(self, card):
+        stored = self.cards.get(card.number)
+        if stored is not None:
+            stored.pin = card.pin
+            stored.account.balance = card.account.balance
+        return
+
+    def remove_card(self, card):
+        stored = self.cards.get(card.number)
+        if stored is not None and stored.pin == card.pin:
+            del self.cards[card.number]
+        return
 
     def get_last_emitted_card(self):
-        if len(self.cards) > 0:
-            return self.cards[-1]
+        if self.last_emitted_card is not None:
+            return self.last_emitted_card
         else:
             return Card(4000_0000_0000_0000, 0000)
 
+    def get_allocation_room(self, last_card):
+        return 10**9 - 1 - last_card.get_customer_account_number()
+
     def is_card(self, card):
-        return card in self.cards
+        return card.number in self.cards
 
     def get_card(self, number):
-        for card in self.cards:
-            if card.number == number:
-                return card
+        try:
+            return self.cards[number]
+        except KeyError:
+            raise ValueError("No such card (number: {} )in database!".format(number))
+
+    def deposit(self, number, amount):
+        account = self.get_card(number).account
+        account.deposit(amount)
+        return account.balance
 
-        raise ValueError("No such card (number: {} )in database!".format(number))
+    def transfer(self, source_number, target_number, amount):
+        source = self.get_card(source_number)
+        target = self.get_card(target_number)
+        source.account.withdraw(amount)
+        target.account.deposit(amount)
+        return source.account.balance
+
+    def get_balances(self, numbers):
+        balances = {}
+        for number in numbers:
+            try:
+                balances[number] = self.get_card(number).account.balance
+            except ValueError:
+                continue
+
+        return balances
+
+    def apply_balance_deltas(self, deltas):
+        accounts = [(self.get_card(number).account, delta) for number, delta in deltas.items()]
+        for account, delta in accounts:
+            if account.balance + delta < 0:
+                raise ValueError("Not enough found to withdraw {}!".format(-delta))
+
+        for account, delta in accounts:
+            account.balance += delta
+        return
 
 
 class CardDataBaseSqlite3(CardDataBase):
-    def __init__(self):
+    def __init__(self, path='card.s3db', cached_statements=256, commit_every=None, commit_interval=None,
+                 synchronous=None, profile='default', check_same_thread=True):
         super().__init__()
-        self.connection = sqlite3.connect('card.s3db')
+        # Queries are parameterized, but the common paths still use some forty
+        # statements, plus one per IN list width and savepoint name: the cache
+        # is sized well past that so none of them gets re-prepared.
+        # The commit_interval timer commits from a thread of its own.
+        self.connection = sqlite3.connect(
+            path, cached_statements=cached_statements,
+            check_same_thread=check_same_thread and commit_interval is None
+        )
         self.cursor = self.connection.cursor()
-        try:
+        self.apply_profile(profile)
+        if synchronous is not None:
+            self.set_synchronous(synchronous)
+
+        self.migrate()
+
+        # Group commit: writes accumulate in one open transaction until
+        # commit_every of them are pending or commit_interval seconds have
+        # passed since the last commit, whichever comes first; a timer commits
+        # the tail of a burst. With neither set every write commits, and
+        # commit_every=0 alone leaves commits to flush. The lock keeps the
+        # timer from committing half of an operation.
+        if commit_every is None:
+            commit_every = 1 if commit_interval is None else 0
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.pending_writes = 0
+        self.last_commit = time.monotonic()
+        self.flush_timer = None
+        self.lock = threading.RLock()
+
+    def apply_profile(self, profile):
+        if not isinstance(profile, dict):
+            try:
+                profile = PRAGMA_PROFILES[profile]
+            except KeyError:
+                raise ValueError("No such PRAGMA profile ({})!".format(profile))
+
+        for name, value in profile.items():
+            self.set_pragma(name, value)
+        return
+
+    def set_pragma(self, name, value):
+        if name not in PRAGMA_SETTINGS:
+            raise ValueError("Unsupported PRAGMA ({})!".format(name))
+
+        if name == 'synchronous':
+            self.set_synchronous(value)
+            return
+
+        # PRAGMA values can't be bound as parameters: only accept plain words and integers.
+        if not str(value).lstrip('-').isalnum():
+            raise ValueError("Invalid value ({}) for PRAGMA {}!".format(value, name))
+
+        self.cursor.execute(f"PRAGMA {name} = {value}")
+        self.cursor.fetchall()
+        return
+
+    def get_pragma(self, name):
+        if name not in PRAGMA_SETTINGS:
+            raise ValueError("Unsupported PRAGMA ({})!".format(name))
+
+        self.cursor.execute(f"PRAGMA {name}")
+        return self.cursor.fetchone()[0]
+
+    def set_synchronous(self, synchronous):
+        synchronous = str(synchronous).upper()
+        if synchronous not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError("Invalid synchronous setting ({})!".format(synchronous))
+
+        self.cursor.execute(f"PRAGMA synchronous = {synchronous}")
+        return
+
+    def commit(self):
+        with self.lock:
+            self.pending_writes += 1
+            if self.commit_every and self.pending_writes >= self.commit_every:
+                self.flush()
+            elif self.commit_interval is not None:
+                wait = self.last_commit + self.commit_interval - time.monotonic()
+                if wait <= 0:
+                    self.flush()
+                elif self.flush_timer is None:
+                    self.flush_timer = threading.Timer(wait, self.flush_pending)
+                    self.flush_timer.daemon = True
+                    self.flush_timer.start()
+        return
+
+    def flush(self):
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            self.connection.commit()
+            self.pending_writes = 0
+            self.last_commit = time.monotonic()
+        return
+
+    def flush_pending(self):
+        with self.lock:
+            self.flush_timer = None
+            if self.pending_writes:
+                self.flush()
+        return
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.connection.close()
+        return
+
+    @contextlib.contextmanager
+    def savepoint(self, name):
+        # A savepoint undoes a failed operation without discarding group commit writes.
+        # With no such writes the whole transaction is rolled back, so a failed
+        # operation doesn't keep holding the write lock.
+        with self.lock:
+            began = not self.connection.in_transaction
+            if began:
+                self.cursor.execute("BEGIN")
+            self.cursor.execute(f"SAVEPOINT {name}")
+            try:
+                yield
+            except BaseException:
+                self.cursor.execute(f"ROLLBACK TO {name}")
+                self.cursor.execute(f"RELEASE {name}")
+                if began or self.pending_writes == 0:
+                    self.connection.rollback()
+                raise
+
+            self.cursor.execute(f"RELEASE {name}")
+
+    def get_schema_version(self):
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+
+    def migrate(self):
+        migrations = [self.migrate_to_version_1, self.migrate_to_version_2, self.migrate_to_version_3]
+        # The version is read again once the write lock is held: another
+        # process opening the same file may have migrated it in the meantime.
+        while self.get_schema_version() < len(migrations):
+            self.cursor.execute("BEGIN IMMEDIATE")
+            try:
+                version = self.get_schema_version()
+                if version < len(migrations):
+                    migrations[version]()
+                    self.cursor.execute(f"PRAGMA user_version = {version + 1}")
+            except sqlite3.Error:
+                self.connection.rollback()
+                raise
+
+            self.connection.commit()
+        return
+
+    def has_card_table(self):
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'card'")
+        return self.cursor.fetchone() is not None
+
+    def create_card_table(self, name='card'):
+        self.cursor.execute(
+            f"CREATE TABLE {name}(\n" +
+            f"   id INTEGER PRIMARY KEY,\n" +
+            f"   number TEXT NOT NULL,\n" +
+            f"   pin TEXT NOT NULL,\n" +
+            f"   balance INTEGER NOT NULL DEFAULT 0\n" +
+            f")"
+        )
+        return
+
+    def create_card_number_index(self):
+        self.cursor.execute("CREATE UNIQUE INDEX card_number ON card(number)")
+        return
+
+    def migrate_to_version_1(self):
+        if not self.has_card_table():
             self.create_card_table()
-        except sqlite3.OperationalError:
+            self.create_card_number_index()
             return
 
-    def create_card_table(self):
+        # Legacy tables have no key and may hold the same number several times:
+        # keep the most recent row of each number and reuse its rowid as id.
+        self.create_card_table('card_version_1')
         self.cursor.execute(
-            "CREATE TABLE card(\n" +
-            "   id INTEGER,\n" +
-            "   number TEXT,\n" +
-            "   pin TEXT,\n" +
-            "   balance INTEGER DEFAULT 0\n" +
+            "INSERT INTO card_version_1 (id, number, pin, balance)\n" +
+            "SELECT rowid, number, pin, COALESCE(balance, 0)\n" +
+            "FROM card\n" +
+            "WHERE rowid IN (\n" +
+            "   SELECT MAX(rowid) FROM card WHERE number IS NOT NULL AND pin IS NOT NULL GROUP BY number\n" +
             ")"
         )
-        self.connection.commit()
+        self.cursor.execute("DROP TABLE card")
+        self.cursor.execute("ALTER TABLE card_version_1 RENAME TO card")
+        self.create_card_number_index()
         return
 
-    def add_card(self, card):
+    def migrate_to_version_2(self):
+        # Append-only ledger of balance movements: integer keys only, and rows
+        # are written inside the transaction of the balance change they record.
         self.cursor.execute(
-            f"INSERT INTO card (number, pin, balance) VALUES ({card.number}, {card.pin}, {card.account.balance})"
+            "CREATE TABLE transactions(\n" +
+            "   id INTEGER PRIMARY KEY,\n" +
+            "   number INTEGER NOT NULL,\n" +
+            "   amount INTEGER NOT NULL,\n" +
+            "   balance INTEGER NOT NULL,\n" +
+            "   counterparty INTEGER,\n" +
+            "   created INTEGER NOT NULL\n" +
+            ")"
         )
-        self.connection.commit()
+        self.cursor.execute("CREATE INDEX transactions_number ON transactions(number, id)")
         return
 
-    def update_card(self, card):
+    def migrate_to_version_3(self):
+        # Allocation high-water mark: the number with the highest customer
+        # account number ever added. It only moves up, so removing or importing
+        # cards can't make CardFactory issue a number twice.
+        self.cursor.execute("CREATE TABLE card_sequence(number INTEGER NOT NULL)")
         self.cursor.execute(
-            f"UPDATE card SET\n"
-            f"  number = {card.number},\n"
-            f"  pin = {card.pin},\n"
-            f"  balance = {card.account.balance}\n"
-            f"WHERE\n"
-            f"  number = {card.number}\n"
-            f";"
+            "INSERT INTO card_sequence (number)\n" +
+            "SELECT COALESCE((\n" +
+            "   SELECT CAST(number AS INTEGER) FROM card\n" +
+            "   ORDER BY CAST(number AS INTEGER) / 10 % 1000000000 DESC, id DESC LIMIT 1\n" +
+            "), 4000000000000000)"
         )
-        self.connection.commit()
         return
 
+    def advance_sequence(self, numbers):
+        last = None
+        for number in numbers:
+            if last is None or number // 10 % 10**9 >= last // 10 % 10**9:
+                last = number
+
+        if last is not None:
+            self.cursor.execute(
+                "UPDATE card_sequence SET number = ? WHERE ? / 10 % 1000000000 >= number / 10 % 1000000000",
+                (last, last)
+            )
+        return
+
+    def record_transactions(self, transactions):
+        created = int(time.time())
+        self.cursor.executemany(
+            "INSERT INTO transactions (number, amount, balance, counterparty, created) VALUES (?, ?, ?, ?, ?)",
+            ((number, amount, balance, counterparty, created) for number, amount, balance, counterparty in transactions)
+        )
+        return
+
+    def get_history(self, number, limit=10):
+        self.cursor.execute(
+            "SELECT\n" +
+            "  amount,\n" +
+            "  balance,\n" +
+            "  counterparty,\n" +
+            "  created\n" +
+            "FROM\n" +
+            "  transactions\n" +
+            "WHERE\n" +
+            "  number = ?\n" +
+            "ORDER BY\n" +
+            "  id DESC\n" +
+            "LIMIT ?\n" +
+            ";",
+            (number, limit)
+        )
+        return self.cursor.fetchall()
+
+    def add_card(self, card):
+        try:
+            with self.savepoint('add_card'):
+                self.cursor.execute(
+                    "INSERT INTO card (number, pin, balance) VALUES (?, ?, ?)",
+                    (card.number, card.pin, card.account.balance)
+                )
+                self.advance_sequence((card.number,))
+        except sqlite3.IntegrityError:
+            raise ValueError("Card (number: {} ) already in database!".format(card.number))
+
+        self.commit()
+        return
+
+    def add_cards(self, cards):
+        cards = list(cards)
+        try:
+            with self.savepoint('add_cards'):
+                self.cursor.executemany(
+                    "INSERT INTO card (number, pin, balance) VALUES (?, ?, ?)",
+                    ((card.number, card.pin, card.account.balance) for card in cards)
+                )
+                self.advance_sequence(card.number for card in cards)
+        except sqlite3.IntegrityError:
+            raise ValueError("Some cards are already in database!")
+
+        self.commit()
+        return
+
+    def update_card(self, card):
+        with self.savepoint('update_card'):
+            # An overwritten balance is recorded as the difference it makes.
+            self.cursor.execute(
+                "INSERT INTO transactions (number, amount, balance, created)\n" +
+                "SELECT CAST(number AS INTEGER), ? - balance, ?, ?\n" +
+                "FROM card\n" +
+                "WHERE number = ? AND balance != ?",
+                (card.account.balance, card.account.balance, int(time.time()), card.number, card.account.balance)
+            )
+            self.cursor.execute(
+                "UPDATE card SET\n" +
+                "  pin = ?,\n" +
+                "  balance = ?\n" +
+                "WHERE\n" +
+                "  number = ?\n" +
+                ";",
+                (card.pin, card.account.balance, card.number)
+            )
+
+        self.commit()
+        return
+
+    def deposit(self, number, amount, counterparty=None):
+        if amount < 0:
+            raise ValueError("Invalid amount ({}) for deposit!".format(amount))
+
+        with self.savepoint('deposit'):
+            self.cursor.execute(
+                "UPDATE card SET\n" +
+                "  balance = balance + ?\n" +
+                "WHERE\n" +
+                "  number = ?\n" +
+                "RETURNING balance\n" +
+                ";",
+                (amount, number)
+            )
+            row = self.cursor.fetchone()
+            if row is None:
+                raise ValueError("No such card (number: {} )in database!".format(number))
+
+            self.record_transactions([(number, amount, row[0], counterparty)])
+
+        self.commit()
+        return row[0]
+
+    def withdraw(self, number, amount, counterparty=None):
+        if amount < 0:
+            raise ValueError("Invalid amount ({}) for withdraw!".format(amount))
+
+        with self.savepoint('withdraw'):
+            self.cursor.execute(
+                "UPDATE card SET\n" +
+                "  balance = balance - ?\n" +
+                "WHERE\n" +
+                "  number = ? AND balance >= ?\n" +
+                "RETURNING balance\n" +
+                ";",
+                (amount, number, amount)
+            )
+            row = self.cursor.fetchone()
+            if row is None:
+                raise ValueError("Not enough found to withdraw {} from card {}!".format(amount, number))
+
+            self.record_transactions([(number, -amount, row[0], counterparty)])
+
+        self.commit()
+        return row[0]
+
     def get_card(self, number):
         self.cursor.execute(
-            f"SELECT\n" +
-            f"  number,\n" +
-            f"  pin,\n" +
-            f"  balance\n"
-            f"FROM\n"
-            f"  card\n"
-            f"WHERE\n" +
-            f"  number={number}\n"
-            f";"
+            "SELECT\n" +
+            "  number,\n" +
+            "  pin,\n" +
+            "  balance\n" +
+            "FROM\n" +
+            "  card\n" +
+            "WHERE\n" +
+            "  number = ?\n" +
+            ";",
+            (number,)
         )
         try:
             number, pin, balance = self.cursor.fetchone()
@@ -90,33 +554,850 @@ class CardDataBaseSqlite3(CardDataBase):
         return card
 
     def get_last_emitted_card(self):
+        # The card itself may have been removed since: its number still counts.
         self.cursor.execute(
-            f"SELECT\n" +
-            f"  number,\n" +
-            f"  pin,\n" +
-            f"  balance\n"
-            f"FROM\n"
-            f"  card\n"
-            f";"
+            "SELECT\n" +
+            "  card_sequence.number,\n" +
+            "  COALESCE(card.pin, 0),\n" +
+            "  COALESCE(card.balance, 0)\n" +
+            "FROM\n" +
+            "  card_sequence\n" +
+            "  LEFT JOIN card ON card.number = CAST(card_sequence.number AS TEXT)\n" +
+            ";"
         )
-        try:
-            number, pin, balance = self.cursor.fetchall()[-1]
-        except IndexError:
-            number = 4000_0000_0000_0000
-            pin = 0000
-            balance = 0
+        number, pin, balance = self.cursor.fetchone()
 
         card = Card(int(number), int(pin))
         card.account.balance = int(balance)
         return card
 
+    def transfer(self, source_number, target_number, amount):
+        if amount < 0:
+            raise ValueError("Invalid amount ({}) for transfer!".format(amount))
+
+        with self.savepoint('transfer'):
+            self.cursor.execute(
+                "UPDATE card SET\n" +
+                "  balance = balance - ?\n" +
+                "WHERE\n" +
+                "  number = ? AND balance >= ?\n" +
+                "RETURNING balance\n" +
+                ";",
+                (amount, source_number, amount)
+            )
+            row = self.cursor.fetchone()
+            if row is None:
+                raise ValueError("Not enough found to transfer {} from card {}!".format(amount, source_number))
+
+            self.cursor.execute(
+                "UPDATE card SET\n" +
+                "  balance = balance + ?\n" +
+                "WHERE\n" +
+                "  number = ?\n" +
+                "RETURNING balance\n" +
+                ";",
+                (amount, target_number)
+            )
+            target_row = self.cursor.fetchone()
+            if target_row is None:
+                raise ValueError("No such card (number: {} )in database!".format(target_number))
+
+            self.record_transactions([
+                (source_number, -amount, row[0], target_number),
+                (target_number, amount, target_row[0], source_number),
+            ])
+
+        self.commit()
+        return row[0]
+
+    def get_balances(self, numbers, chunk_size=500):
+        balances = {}
+        numbers = list(numbers)
+        for start in range(0, len(numbers), chunk_size):
+            chunk = numbers[start:start + chunk_size]
+            self.cursor.execute(
+                "SELECT number, balance FROM card WHERE number IN ({})".format(', '.join('?' * len(chunk))),
+                chunk
+            )
+            for number, balance in self.cursor:
+                balances[int(number)] = balance
+
+        return balances
+
+    def apply_balance_deltas(self, deltas):
+        with self.savepoint('apply_balance_deltas'):
+            self.cursor.executemany(
+                "UPDATE card SET\n" +
+                "  balance = balance + ?\n" +
+                "WHERE\n" +
+                "  number = ? AND balance + ? >= 0\n" +
+                ";",
+                ((delta, number, delta) for number, delta in deltas.items())
+            )
+            if self.cursor.rowcount != len(deltas):
+                raise ValueError("Balances changed or cards were removed while settling!")
+
+            created = int(time.time())
+            self.cursor.executemany(
+                "INSERT INTO transactions (number, amount, balance, created)\n" +
+                "SELECT CAST(number AS INTEGER), ?, balance, ?\n" +
+                "FROM card\n" +
+                "WHERE number = ?",
+                ((delta, created, number) for number, delta in deltas.items())
+            )
+
+        self.commit()
+        return
+
     def remove_card(self, card):
         self.cursor.execute(
-            f"DELETE FROM card WHERE number={card.number} AND pin={card.pin}"
+            "DELETE FROM card WHERE number = ? AND pin = ?",
+            (card.number, card.pin)
         )
-        self.connection.commit()
+        self.commit()
+        return
+
+    def write_snapshot(self, path, batch_size=10_000):
+        last_number = self.get_last_emitted_card().number
+        cursor = self.connection.cursor()
+        # Numbers are 16 digit strings, so the unique index already returns them in numeric order.
+        cursor.execute("SELECT number, pin, balance FROM card ORDER BY number")
+
+        count, previous = 0, -1
+        with open(path, 'wb') as file:
+            file.write(bytes(SNAPSHOT_HEADER.size))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                records = array.array('q')
+                for number, pin, balance in rows:
+                    number = int(number)
+                    if number <= previous:
+                        raise ValueError("Card numbers out of order, can't snapshot card {}!".format(number))
+                    records.extend((number, int(pin), balance))
+                    previous = number
+                    count += 1
+                records.tofile(file)
+
+            file.seek(0)
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, sys.byteorder.encode(), count, last_number))
+
+        cursor.close()
+        return count
+
+    def get_export_format(self, path, file_format):
+        file_format = file_format or path.rsplit('.', 1)[-1].lower()
+        if file_format not in ('csv', 'jsonl'):
+            raise ValueError("Unsupported card file format ({})!".format(file_format))
+
+        return file_format
+
+    # Export and import go through batch_size rows at a time, so memory stays
+    # the same whatever the size of the table or the file.
+    def export_cards(self, path, file_format=None, batch_size=1_000):
+        file_format = self.get_export_format(path, file_format)
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT number, pin, balance FROM card ORDER BY id")
+
+        count = 0
+        with open(path, 'w', newline='') as file:
+            if file_format == 'csv':
+                writer = csv.writer(file)
+                writer.writerow(('number', 'pin', 'balance'))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                for number, pin, balance in rows:
+                    if file_format == 'csv':
+                        writer.writerow((int(number), str(pin).zfill(4), balance))
+                    else:
+                        file.write(json.dumps({'number': int(number), 'pin': str(pin).zfill(4), 'balance': balance}) + '\n')
+                count += len(rows)
+
+        cursor.close()
+        return count
+
+    def import_cards(self, path, file_format=None, batch_size=1_000):
+        file_format = self.get_export_format(path, file_format)
+        card_factory = CardFactory(self)
+
+        count = 0
+        with open(path, newline='') as file:
+            if file_format == 'csv':
+                rows = csv.DictReader(file)
+            else:
+                rows = (json.loads(line) for line in file if line.strip())
+
+            try:
+                with self.savepoint('import_cards'):
+                    batch = []
+                    for row in rows:
+                        number = int(row['number'])
+                        if not card_factory.is_valid(number):
+                            raise ValueError("Invalid card number ({}) in {}!".format(number, path))
+
+                        batch.append((number, int(row['pin']), int(row['balance'])))
+                        if len(batch) == batch_size:
+                            self.cursor.executemany("INSERT INTO card (number, pin, balance) VALUES (?, ?, ?)", batch)
+                            self.advance_sequence(number for number, pin, balance in batch)
+                            count += len(batch)
+                            batch = []
+
+                    self.cursor.executemany("INSERT INTO card (number, pin, balance) VALUES (?, ?, ?)", batch)
+                    self.advance_sequence(number for number, pin, balance in batch)
+                    count += len(batch)
+            except sqlite3.IntegrityError:
+                raise ValueError("Some cards are already in database!")
+
+        self.commit()
+        return count
+
+
+class CardDataBaseSqlite3Pool(CardDataBase):
+    def __init__(self, path='card.s3db', profile='wal', durable=False, **options):
+        super().__init__()
+        if path == ':memory:':
+            raise ValueError("A pool needs a database file, every connection to :memory: is a new database!")
+
+        self.path = path
+        self.profile = profile
+        self.options = options
+
+        # All writes are queued to one writer thread owning the only writing
+        # connection; every reading thread gets a connection of its own, so
+        # reads run concurrently under the WAL journal. Durable writes return
+        # only once committed: the writer takes every queued write, runs them
+        # and commits them together before answering any of them.
+        self.durable = durable
+        if durable:
+            options = dict(options, commit_every=0, commit_interval=None)
+        self.writer = self.connect(**options)
+        self.writes = queue.SimpleQueue()
+        self.writer_thread = threading.Thread(target=self.run_writer, name='card-writer', daemon=True)
+        self.writer_thread.start()
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+
+    def connect(self, **options):
+        return CardDataBaseSqlite3(self.path, profile=self.profile, check_same_thread=False, **options)
+
+    def get_reader(self):
+        try:
+            return self.local.reader
+        except AttributeError:
+            self.local.reader = self.connect()
+            with self.readers_lock:
+                self.readers.append(self.local.reader)
+            return self.local.reader
+
+    def write(self, method, *arguments):
+        future = Future()
+        self.writes.put((future, method, arguments))
+        return future.result()
+
+    def run_writer(self):
+        while True:
+            writes = [self.writes.get()]
+            while True:
+                try:
+                    writes.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            done = []
+            for write in writes:
+                if write is None:
+                    break
+                future, method, arguments = write
+                try:
+                    done.append((future, method(*arguments), None))
+                except Exception as error:
+                    done.append((future, None, error))
+
+            if self.durable and self.writer.pending_writes:
+                try:
+                    self.writer.flush()
+                except sqlite3.Error as error:
+                    self.writer.connection.rollback()
+                    self.writer.pending_writes = 0
+                    done = [(future, None, failure or error) for future, result, failure in done]
+
+            for future, result, error in done:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+            if None in writes:
+                return
+
+    def add_card(self, card):
+        return self.write(self.writer.add_card, card)
+
+    def add_cards(self, cards):
+        return self.write(self.writer.add_cards, list(cards))
+
+    def update_card(self, card):
+        return self.write(self.writer.update_card, card)
+
+    def deposit(self, number, amount, counterparty=None):
+        return self.write(self.writer.deposit, number, amount, counterparty)
+
+    def withdraw(self, number, amount, counterparty=None):
+        return self.write(self.writer.withdraw, number, amount, counterparty)
+
+    def remove_card(self, card):
+        return self.write(self.writer.remove_card, card)
+
+    def transfer(self, source_number, target_number, amount):
+        return self.write(self.writer.transfer, source_number, target_number, amount)
+
+    def apply_balance_deltas(self, deltas):
+        return self.write(self.writer.apply_balance_deltas, deltas)
+
+    def import_cards(self, path, file_format=None, batch_size=1_000):
+        return self.write(self.writer.import_cards, path, file_format, batch_size)
+
+    def export_cards(self, path, file_format=None, batch_size=1_000):
+        return self.get_reader().export_cards(path, file_format, batch_size)
+
+    def write_snapshot(self, path, batch_size=10_000):
+        return self.get_reader().write_snapshot(path, batch_size)
+
+    def flush(self):
+        return self.write(self.writer.flush)
+
+    def get_last_emitted_card(self):
+        # Allocation must see writes still waiting for a group commit.
+        return self.write(self.writer.get_last_emitted_card)
+
+    def is_card(self, card):
+        try:
+            self.get_card(card.number)
+        except ValueError:
+            return False
+
+        return True
+
+    def get_card(self, number):
+        return self.get_reader().get_card(number)
+
+    def get_balances(self, numbers):
+        return self.get_reader().get_balances(numbers)
+
+    def get_history(self, number, limit=10):
+        return self.get_reader().get_history(number, limit)
+
+    def close(self):
+        self.write(self.writer.close)
+        self.writes.put(None)
+        self.writer_thread.join()
+        with self.readers_lock:
+            for reader in self.readers:
+                reader.close()
+            self.readers = []
+        return
+
+
+class ShardAllocationLock:
+    # Every allocation takes the next shard in turn and locks only that shard,
+    # so card issuance on different shards runs concurrently. Full shards are
+    # passed over.
+    def __init__(self, shards, is_full):
+        self.shards = shards
+        self.is_full = is_full
+        self.turns = itertools.count()
+        self.local = threading.local()
+
+    def __enter__(self):
+        for _ in range(len(self.shards)):
+            index = next(self.turns) % len(self.shards)
+            self.shards[index].allocation_lock.acquire()
+            if not self.is_full(index):
+                self.local.index = index
+                return self
+            self.shards[index].allocation_lock.release()
+
+        raise ValueError("All shards are full!")
+
+    def __exit__(self, *exception):
+        index = self.local.index
+        del self.local.index
+        self.shards[index].allocation_lock.release()
+
+    def get_index(self):
+        return getattr(self.local, 'index', None)
+
+
+class ShardedCardDataBase(CardDataBase):
+    # Shard k stores the customer account numbers [k * shard_size, (k + 1) * shard_size).
+    def __init__(self, paths, shard_size=None, **options):
+        super().__init__()
+        self.shards = [CardDataBaseSqlite3(path, **options) for path in paths]
+        self.shard_size = shard_size or (10**9 + len(self.shards) - 1) // len(self.shards)
+        self.allocation_lock = ShardAllocationLock(self.shards, self.is_shard_full)
+
+    def get_shard_index(self, number):
+        index = number // 10 % 10**9 // self.shard_size
+        if index >= len(self.shards):
+            raise ValueError("No shard for card (number: {} )!".format(number))
+
+        return index
+
+    def get_shard(self, number):
+        return self.shards[self.get_shard_index(number)]
+
+    def get_shard_end(self, index):
+        return min((index + 1) * self.shard_size, 10**9)
+
+    def is_shard_full(self, index):
+        return self.shards[index].get_last_emitted_card().get_customer_account_number() + 1 >= self.get_shard_end(index)
+
+    def group_by_shard(self, numbers):
+        groups = {}
+        for number in numbers:
+            groups.setdefault(self.get_shard_index(number), []).append(number)
+
+        return groups
+
+    def get_last_emitted_card(self):
+        index = self.allocation_lock.get_index()
+        if index is None:
+            return max(
+                (shard.get_last_emitted_card() for shard in self.shards),
+                key=lambda card: card.get_customer_account_number()
+            )
+
+        # Inside an allocation: the last card of the shard whose turn it is, or
+        # a sentinel just below its range so the next number lands in it.
+        first_customer_id = index * self.shard_size
+        card = self.shards[index].get_last_emitted_card()
+        if card.get_customer_account_number() < first_customer_id:
+            card = Card((4000_00 * 10**9 + max(first_customer_id - 1, 0)) * 10, 0000)
+        if card.get_customer_account_number() + 1 >= self.get_shard_end(index):
+            raise ValueError("Shard {} is full!".format(index))
+
+        return card
+
+    def get_allocation_room(self, last_card):
+        # Only the shard whose turn it is is locked: a batch must not run past its end.
+        index = self.allocation_lock.get_index()
+        if index is None:
+            return super().get_allocation_room(last_card)
+
+        return self.get_shard_end(index) - 1 - last_card.get_customer_account_number()
+
+    def add_card(self, card):
+        return self.get_shard(card.number).add_card(card)
+
+    def add_cards(self, cards):
+        # Atomic within each shard only.
+        groups = {}
+        for card in cards:
+            groups.setdefault(self.get_shard_index(card.number), []).append(card)
+
+        for index, shard_cards in groups.items():
+            self.shards[index].add_cards(shard_cards)
+        return
+
+    def update_card(self, card):
+        return self.get_shard(card.number).update_card(card)
+
+    def remove_card(self, card):
+        return self.get_shard(card.number).remove_card(card)
+
+    def is_card(self, card):
+        try:
+            self.get_card(card.number)
+        except ValueError:
+            return False
+
+        return True
+
+    def get_card(self, number):
+        return self.get_shard(number).get_card(number)
+
+    def get_history(self, number, limit=10):
+        return self.get_shard(number).get_history(number, limit)
+
+    def deposit(self, number, amount, counterparty=None):
+        return self.get_shard(number).deposit(number, amount, counterparty)
+
+    def withdraw(self, number, amount, counterparty=None):
+        return self.get_shard(number).withdraw(number, amount, counterparty)
+
+    def transfer(self, source_number, target_number, amount):
+        source_shard = self.get_shard(source_number)
+        target_shard = self.get_shard(target_number)
+        if source_shard is target_shard:
+            return source_shard.transfer(source_number, target_number, amount)
+
+        # Across shards: debit, then credit, and refund the debit if the credit fails.
+        balance = source_shard.withdraw(source_number, amount, target_number)
+        try:
+            target_shard.deposit(target_number, amount, source_number)
+        except ValueError:
+            source_shard.deposit(source_number, amount, target_number)
+            raise
+
+        return balance
+
+    def get_balances(self, numbers):
+        balances = {}
+        for index, shard_numbers in self.group_by_shard(numbers).items():
+            balances.update(self.shards[index].get_balances(shard_numbers))
+
+        return balances
+
+    def apply_balance_deltas(self, deltas):
+        applied = []
+        try:
+            for index, numbers in self.group_by_shard(deltas).items():
+                shard_deltas = {number: deltas[number] for number in numbers}
+                self.shards[index].apply_balance_deltas(shard_deltas)
+                applied.append((index, shard_deltas))
+        except ValueError:
+            for index, shard_deltas in applied:
+                self.shards[index].apply_balance_deltas({number: -delta for number, delta in shard_deltas.items()})
+            raise
+
+        return
+
+    def flush(self):
+        for shard in self.shards:
+            shard.flush()
         return
 
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        return
+
+
+class CachedCardDataBase:
+    def __init__(self, card_data_base, max_size=10_000, ttl=None):
+        self.card_data_base = card_data_base
+        self.allocation_lock = card_data_base.allocation_lock
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # number -> (pin, balance, expiry); cards are rebuilt on every hit so
+        # callers mutating their copy never change the cached one.
+        self.entries = collections.OrderedDict()
+        # number -> times invalidated, to tell a miss that a write happened
+        # while it was reading the backend.
+        self.invalidations = collections.Counter()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name):
+        return getattr(self.card_data_base, name)
+
+    def cache_info(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+                'max_size': self.max_size,
+            }
+
+    def get_card(self, number):
+        with self.lock:
+            entry = self.entries.get(number)
+            if entry is not None and (entry[2] is None or entry[2] > time.monotonic()):
+                self.entries.move_to_end(number)
+                self.hits += 1
+                card = Card(number, entry[0])
+                card.account.balance = entry[1]
+                return card
+
+            self.misses += 1
+            invalidations = self.invalidations[number]
+
+        card = self.card_data_base.get_card(number)
+        self.store(card, invalidations)
+        return card
+
+    def store(self, card, invalidations):
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            # The row may be older than a write that finished meanwhile.
+            if self.invalidations[card.number] != invalidations:
+                return
+            self.entries[card.number] = (card.pin, card.account.balance, expiry)
+            self.entries.move_to_end(card.number)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return
+
+    def invalidate(self, *numbers):
+        with self.lock:
+            for number in numbers:
+                self.entries.pop(number, None)
+                self.invalidations[number] += 1
+        return
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        return
+
+    # Entries are dropped once the write is done. A miss that read the old row
+    # before that sees the invalidation count change and doesn't store it.
+    def update_card(self, card):
+        try:
+            return self.card_data_base.update_card(card)
+        finally:
+            self.invalidate(card.number)
+
+    def remove_card(self, card):
+        try:
+            return self.card_data_base.remove_card(card)
+        finally:
+            self.invalidate(card.number)
+
+    def deposit(self, number, amount, *arguments):
+        try:
+            return self.card_data_base.deposit(number, amount, *arguments)
+        finally:
+            self.invalidate(number)
+
+    def withdraw(self, number, amount, *arguments):
+        try:
+            return self.card_data_base.withdraw(number, amount, *arguments)
+        finally:
+            self.invalidate(number)
+
+    def transfer(self, source_number, target_number, amount):
+        try:
+            return self.card_data_base.transfer(source_number, target_number, amount)
+        finally:
+            self.invalidate(source_number, target_number)
+
+    def apply_balance_deltas(self, deltas):
+        try:
+            return self.card_data_base.apply_balance_deltas(deltas)
+        finally:
+            self.invalidate(*deltas)
+
+
+class CardSnapshot:
+    # Read-only card lookups straight from a memory-mapped snapshot: nothing is
+    # loaded up front and get_card binary searches the records in place.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byteorder, self.count, self.last_number = SNAPSHOT_HEADER.unpack_from(self.mmap)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError("Not a card snapshot ({})!".format(path))
+        if byteorder.rstrip(b'\0') != sys.byteorder.encode():
+            self.close()
+            raise ValueError("Card snapshot ({}) has {} endian records!".format(path, byteorder.rstrip(b'\0').decode()))
+
+        self.view = memoryview(self.mmap)
+        self.records = self.view[SNAPSHOT_HEADER.size:].cast('q')
+        self.numbers = self.records[0::3]
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        for view in ('numbers', 'records', 'view'):
+            if hasattr(self, view):
+                getattr(self, view).release()
+        self.mmap.close()
+        self.file.close()
+        return
+
+    def get_record(self, index):
+        card = Card(self.records[3 * index], self.records[3 * index + 1])
+        card.account.balance = self.records[3 * index + 2]
+        return card
+
+    def find(self, number):
+        index = bisect.bisect_left(self.numbers, number)
+        if index < self.count and self.numbers[index] == number:
+            return index
+
+        return None
+
+    def get_card(self, number):
+        index = self.find(number)
+        if index is None:
+            raise ValueError("No such card (number: {} )in database!".format(number))
+
+        return self.get_record(index)
+
+    def is_card(self, card):
+        return self.find(card.number) is not None
+
+    def get_last_emitted_card(self):
+        index = self.find(self.last_number)
+        if index is not None:
+            return self.get_record(index)
+        else:
+            return Card(self.last_number, 0000)
+
+    def get_balances(self, numbers):
+        balances = {}
+        for number in numbers:
+            index = self.find(number)
+            if index is not None:
+                balances[number] = self.records[3 * index + 2]
+
+        return balances
+
+    def to_cards(self):
+        for index in range(self.count):
+            yield self.get_record(index)
+
+    def to_card_table(self):
+        records = array.array('q')
+        records.frombytes(self.view[SNAPSHOT_HEADER.size:])
+        card_table = CardTable()
+        card_table.numbers = records[0::3]
+        card_table.pins = records[1::3]
+        card_table.balances = records[2::3]
+        return card_table
+
+
+class InstrumentedCardDataBase:
+    # Opt-in timing of every method called on the wrapped database: leave the
+    # database unwrapped and nothing is measured. Latencies go into power of
+    # two nanosecond buckets kept per thread, so recording a call takes no lock.
+    def __init__(self, card_data_base, summary_interval=None, summary_function=print):
+        self.card_data_base = card_data_base
+        self.summary_interval = summary_interval
+        self.summary_function = summary_function
+        self.next_summary = None if summary_interval is None else time.monotonic() + summary_interval
+        self.local = threading.local()
+        self.threads_lock = threading.Lock()
+        self.thread_methods = []
+
+    def __getattr__(self, name):
+        attribute = getattr(self.card_data_base, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+
+        # Wrapped once, then found in the instance dict without coming back here.
+        method = self.instrument(name, attribute)
+        setattr(self, name, method)
+        return method
+
+    def instrument(self, name, method):
+        local = self.local
+        perf_counter_ns = time.perf_counter_ns
+
+        def instrumented(*arguments, **keywords):
+            start = perf_counter_ns()
+            try:
+                return method(*arguments, **keywords)
+            except Exception:
+                self.get_record(name)[1] += 1
+                raise
+            finally:
+                duration = perf_counter_ns() - start
+                try:
+                    record = local.methods[name]
+                except (AttributeError, KeyError):
+                    record = self.get_record(name)
+                # total, errors, max, buckets: the call count is the sum of the buckets.
+                record[0] += duration
+                if duration > record[2]:
+                    record[2] = duration
+                record[3][duration.bit_length()] += 1
+
+                if self.next_summary is not None:
+                    self.check_summary()
+
+        instrumented.__name__ = name
+        return instrumented
+
+    def get_record(self, name):
+        if not hasattr(self.local, 'methods'):
+            self.local.methods = {}
+            with self.threads_lock:
+                self.thread_methods.append(self.local.methods)
+
+        if name not in self.local.methods:
+            self.local.methods[name] = [0, 0, 0, [0] * 64]
+        return self.local.methods[name]
+
+    def check_summary(self):
+        with self.threads_lock:
+            if time.monotonic() < self.next_summary:
+                return
+            self.next_summary = time.monotonic() + self.summary_interval
+
+        self.summary_function(self.summary())
+        return
+
+    def get_percentile(self, buckets, count, fraction):
+        # Upper bound of the bucket holding the given fraction of the calls.
+        seen = 0
+        for bucket, bucket_count in enumerate(buckets):
+            seen += bucket_count
+            if seen >= count * fraction:
+                return 2**bucket / 1e6
+
+        return 0
+
+    def stats(self):
+        merged = {}
+        with self.threads_lock:
+            for methods in self.thread_methods:
+                for name, (total, errors, longest, buckets) in list(methods.items()):
+                    record = merged.setdefault(name, [0, 0, 0, [0] * 64])
+                    record[0] += total
+                    record[1] += errors
+                    record[2] = max(record[2], longest)
+                    record[3] = [merged_count + bucket_count for merged_count, bucket_count in zip(record[3], buckets)]
+
+        stats = {}
+        for name, (total, errors, longest, buckets) in merged.items():
+            count = sum(buckets)
+            if count == 0:
+                continue
+
+            stats[name] = {
+                'count': count,
+                'errors': errors,
+                'mean_ms': total / count / 1e6,
+                'max_ms': longest / 1e6,
+                'p50_ms': self.get_percentile(buckets, count, 0.5),
+                'p99_ms': self.get_percentile(buckets, count, 0.99),
+                'histogram': {2**bucket / 1e6: bucket_count for bucket, bucket_count in enumerate(buckets) if bucket_count},
+            }
+
+        return stats
+
+    def reset(self):
+        with self.threads_lock:
+            for methods in self.thread_methods:
+                methods.clear()
+        return
+
+    def summary(self):
+        lines = []
+        for name, method in sorted(self.stats().items(), key=lambda item: -item[1]['count'] * item[1]['mean_ms']):
+            lines.append(
+                f"{name:<24} {method['count']:>10,} calls  mean {method['mean_ms']:.3f} ms  "
+                f"p50 < {method['p50_ms']:.3f} ms  p99 < {method['p99_ms']:.3f} ms  max {method['max_ms']:.3f} ms"
+            )
+
+        return '\n'.join(lines)
+
 
 class CardFactory:
     def __init__(self, card_data_base):
@@ -124,69 +1405,232 @@ class CardFactory:
 
     def new_card(self):
         issuer_identification_number = 4000_00
-        last_customer_id = str(self.card_data_base.get_last_emitted_card().get_customer_account_number())
-        new_customer_id = str(int(last_customer_id) + 1).zfill(9)
-        check_digit = self.compute_check_sum(issuer_identification_number, new_customer_id)
-        new_id = int(
-            str(issuer_identification_number) +
-            str(new_customer_id) +
-            str(check_digit)
-        )
-
         pin = random.choice(range(10000))
-        card = Card(new_id, pin)
-        self.card_data_base.add_card(card)
+        with self.card_data_base.allocation_lock:
+            new_customer_id = self.card_data_base.get_last_emitted_card().get_customer_account_number() + 1
+            check_digit = self.compute_check_sum(issuer_identification_number, new_customer_id)
+            new_id = (issuer_identification_number * 10**9 + new_customer_id) * 10 + check_digit
+
+            card = Card(new_id, pin)
+            self.card_data_base.add_card(card)
         return card
 
+    def new_cards(self, count):
+        issuer_identification_number = 4000_00
+        pins = random.choices(range(10000), k=count)
+        cards = []
+        # An allocation may have less room than asked for (the turn of a nearly
+        # full shard): the rest is then issued in the next allocation.
+        while len(cards) < count:
+            with self.card_data_base.allocation_lock:
+                last_card = self.card_data_base.get_last_emitted_card()
+                batch_size = min(count - len(cards), self.card_data_base.get_allocation_room(last_card))
+                if batch_size <= 0:
+                    raise ValueError("No card numbers left to issue!")
+
+                last_customer_id = last_card.get_customer_account_number()
+                customer_ids = range(last_customer_id + 1, last_customer_id + batch_size + 1)
+
+                prefixes = [issuer_identification_number * 10**9 + customer_id for customer_id in customer_ids]
+                check_digits = self.check_digits_many(prefixes)
+
+                batch = [
+                    Card(prefix * 10 + check_digit, pin)
+                    for prefix, check_digit, pin in zip(prefixes, check_digits, pins[len(cards):])
+                ]
+
+                self.card_data_base.add_cards(batch)
+            cards.extend(batch)
+        return iter(cards)
+
     def compute_check_sum(self, issuer_identification_number, customer_id):
-        initial_number = int(str(issuer_identification_number) + str(customer_id).zfill(9))
-        initial_number = self.double_odd_digit(initial_number)
+        number = int(issuer_identification_number) * 10**9 + int(customer_id)
         sum = 0
-        for digit in str(initial_number):
-            sum += int(digit)
+        while number:
+            number, digit = divmod(number, 10)
+            sum += DOUBLED_DIGITS[digit]
+            number, digit = divmod(number, 10)
+            sum += digit
 
         check_sum = (10 - sum % 10) % 10
         return check_sum
 
-    def double_odd_digit(self, number):
-        output_number = ''
-        for i, digit in enumerate(str(number)):
-            if i % 2 == 0:
-                double = 2 * int(digit)
-                if double >= 10:
-                    double -= 9
+    def is_valid(self, number):
+        number = int(number)
+        if not 10**15 <= number < 10**16:
+            return False
 
-                output_number += str(double)
-            else:
-                output_number += digit
+        check_sum = self.compute_check_sum(number // 10**10, number // 10 % 10**9)
+        return check_sum == number % 10
 
-        return output_number
+    def check_digits_many(self, prefixes):
+        # Check digits of 15-digit prefixes (issuer identification number then
+        # customer account number), four digits per table lookup.
+        table = LUHN_PREFIX_TABLE
+        return [
+            -(
+                table[prefix % 10_000] +
+                table[prefix // 10_000 % 10_000] +
+                table[prefix // 10**8 % 10_000] +
+                table[prefix // 10**12 % 10_000]
+            ) % 10
+            for prefix in prefixes
+        ]
 
-    def is_valid(self, number):
-        issuer_identification_number = int(str(number)[:6])
-        costumer_id = int(str(number)[6:-1])
-        check_sum = self.compute_check_sum(issuer_identification_number, costumer_id)
+    def is_valid_many(self, numbers):
+        # Only 16-digit numbers can be card numbers.
+        table = LUHN_NUMBER_TABLE
+        return [
+            10**15 <= number < 10**16 and (
+                table[number % 10_000] +
+                table[number // 10_000 % 10_000] +
+                table[number // 10**8 % 10_000] +
+                table[number // 10**12]
+            ) % 10 == 0
+            for number in numbers
+        ]
 
-        return check_sum == int(str(number)[-1])
+
+class LedgerSettler:
+    def __init__(self, card_data_base, card_factory):
+        self.card_data_base = card_data_base
+        self.card_factory = card_factory
+
+    def settle(self, transfers):
+        transfers = list(transfers)
+        numbers = set()
+        for source, target, amount in transfers:
+            numbers.update((source, target))
+        balances = self.card_data_base.get_balances(numbers)
+
+        # Transfers are replayed in order against the balances in memory, and
+        # only the net change of every card is written back.
+        deltas = {}
+        failures = []
+        for index, (source, target, amount) in enumerate(transfers):
+            try:
+                self.check_transfer(balances, source, target, amount)
+            except ValueError as error:
+                failures.append((index, (source, target, amount), str(error)))
+                continue
+
+            balances[source] -= amount
+            balances[target] += amount
+            deltas[source] = deltas.get(source, 0) - amount
+            deltas[target] = deltas.get(target, 0) + amount
+
+        self.card_data_base.apply_balance_deltas({number: delta for number, delta in deltas.items() if delta})
+        return failures
+
+    def check_transfer(self, balances, source, target, amount):
+        for number in (source, target):
+            if not self.card_factory.is_valid(number):
+                raise ValueError("Invalid card number ({})!".format(number))
+            if number not in balances:
+                raise ValueError("No such card (number: {} )in database!".format(number))
+
+        if amount < 0:
+            raise ValueError("Invalid amount ({}) for transfer!".format(amount))
+        if balances[source] < amount:
+            raise ValueError("Not enough found to transfer {}!".format(amount))
+        return
 
 
 class Card:
+    __slots__ = ('number', 'pin', 'account')
+
     def __init__(self, number, pin):
         self.number = number
         self.pin = pin
         self.account = Account()
 
     def get_issuer_identification_number(self):
-        return int(str(self.number)[:6])
+        return self.number // 10**10
 
     def get_customer_account_number(self):
-        return int(str(self.number)[6:-1])
+        return self.number // 10 % 10**9
 
     def get_checksum(self):
-        return int(str(self.number)[-1])
+        return self.number % 10
+
+
+class CardTable:
+    # Cards stored column by column, 24 bytes a card instead of a Card and an
+    # Account object each, for bulk work over millions of cards.
+    def __init__(self, cards=()):
+        self.numbers = array.array('q')
+        self.pins = array.array('q')
+        self.balances = array.array('q')
+        self.extend(cards)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("Card table index out of range!")
+
+        return CardRow(self, index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield CardRow(self, index)
+
+    def append(self, card):
+        self.numbers.append(card.number)
+        self.pins.append(card.pin)
+        self.balances.append(card.account.balance)
+        return
+
+    def extend(self, cards):
+        for card in cards:
+            self.append(card)
+        return
+
+    def to_cards(self):
+        for row in self:
+            yield row.to_card()
+
+    def get_memory_size(self):
+        return sum(column.itemsize * len(column) for column in (self.numbers, self.pins, self.balances))
+
+
+class CardRow:
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def number(self):
+        return self.table.numbers[self.index]
+
+    @property
+    def pin(self):
+        return self.table.pins[self.index]
+
+    @property
+    def balance(self):
+        return self.table.balances[self.index]
+
+    @balance.setter
+    def balance(self, balance):
+        self.table.balances[self.index] = balance
+
+    get_issuer_identification_number = Card.get_issuer_identification_number
+    get_customer_account_number = Card.get_customer_account_number
+    get_checksum = Card.get_checksum
+
+    def to_card(self):
+        card = Card(self.number, self.pin)
+        card.account.balance = self.balance
+        return card
 
 
 class Account:
+    __slots__ = ('balance',)
+
     def __init__(self, balance=0):
         self.balance = balance
 
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from banking.banking_controller import run_session_async
+from banking.banking_view import AsyncDisplayer, AsyncRetriever
+from banking.banking_model import CardFactory, CardDataBaseSqlite3, Logger
+
+
+class StreamSession:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def write(self, text):
+        self.writer.write(text.encode())
+        await self.writer.drain()
+
+    async def display(self, message):
+        await self.write(message + '\n')
+
+    async def ask(self, question):
+        await self.write(question + '\n> ')
+        line = await self.reader.readline()
+        if not line:
+            raise EOFError("Client closed the session!")
+
+        return line.decode().strip()
+
+
+class BankingServer:
+    def __init__(self, path='card.s3db', profile='default', max_sessions=1000):
+        # The model lives on a single database thread: sqlite connections can't
+        # be shared between threads, and running every CardFactory and Logger
+        # call there keeps card number allocation free of races.
+        self.database_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+        self.card_data_base, self.card_factory, self.logger = self.database_executor.submit(
+            self.create_model, path, profile
+        ).result()
+
+        # Connections past max_sessions are accepted but wait for a session to end.
+        self.max_sessions = max_sessions
+        self.session_slots = asyncio.Semaphore(max_sessions)
+        self.sessions = {}
+        self.server = None
+
+    def create_model(self, path, profile):
+        card_data_base = CardDataBaseSqlite3(path, profile=profile)
+        return card_data_base, CardFactory(card_data_base), Logger(card_data_base)
+
+    async def call(self, function, *arguments):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.database_executor, functools.partial(function, *arguments))
+
+    async def start(self, host='127.0.0.1', port=8_000):
+        # A short accept queue silently drops connections under bursts of clients.
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=self.max_sessions)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        session = StreamSession(reader, writer)
+        self.sessions[session] = asyncio.current_task()
+        try:
+            async with self.session_slots:
+                await run_session_async(
+                    AsyncDisplayer(session.display),
+                    AsyncRetriever(session.ask),
+                    self.card_data_base,
+                    self.card_factory,
+                    self.logger,
+                    self.call
+                )
+        except (EOFError, ConnectionError):
+            pass
+        except ValueError:
+            await session.write("Invalid input, closing the session.\n")
+        finally:
+            del self.sessions[session]
+            writer.close()
+
+    async def close(self):
+        self.server.close()
+        for session in list(self.sessions):
+            session.writer.close()
+        await asyncio.gather(*self.sessions.values(), return_exceptions=True)
+        await self.server.wait_closed()
+
+        await self.call(self.card_data_base.close)
+        self.database_executor.shutdown()
+
+
+async def serve(host, port, path, profile, max_sessions):
+    banking_server = BankingServer(path, profile, max_sessions)
+    port = await banking_server.start(host, port)
+    print(f"Serving on {host}:{port}")
+    try:
+        await banking_server.server.serve_forever()
+    finally:
+        await banking_server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Line based banking server, one session per connection.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8_000)
+    parser.add_argument('--path', default='card.s3db')
+    parser.add_argument('--profile', default='wal')
+    parser.add_argument('--max-sessions', type=int, default=1000, help="sessions served at once, later clients wait")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.path, args.profile, args.max_sessions))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,113 @@
+import argparse
+import itertools
+import os
+import pathlib
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from banking.banking_model import CardFactory
+
+
+# Set in every worker process by open_worker.
+connection = None
+card_factory = None
+
+
+def open_worker(database_path):
+    # Workers only read: a read-only connection can't take the write lock or
+    # migrate the schema behind the back of the running application.
+    global connection, card_factory
+    connection = sqlite3.connect(pathlib.Path(database_path).absolute().as_uri() + '?mode=ro', uri=True)
+    card_factory = CardFactory(None)
+
+
+def find_existing(numbers, chunk_size=500):
+    existing = set()
+    for start in range(0, len(numbers), chunk_size):
+        chunk = numbers[start:start + chunk_size]
+        cursor = connection.execute(
+            "SELECT number FROM card WHERE number IN ({})".format(', '.join('?' * len(chunk))),
+            chunk
+        )
+        existing.update(int(number) for number, in cursor)
+
+    return existing
+
+
+def validate_chunk(lines):
+    numbers = []
+    for line in lines:
+        line = line.strip()
+        numbers.append(int(line) if line.isdigit() else None)
+
+    valid = card_factory.is_valid_many(number or 0 for number in numbers)
+    existing = find_existing([number for number, is_valid in zip(numbers, valid) if is_valid])
+
+    output = []
+    counts = {'ok': 0, 'missing': 0, 'invalid': 0}
+    for line, number, is_valid in zip(lines, numbers, valid):
+        if not is_valid:
+            status = 'invalid'
+        elif number in existing:
+            status = 'ok'
+        else:
+            status = 'missing'
+        counts[status] += 1
+        output.append(f"{line.strip()},{status}\n")
+
+    return ''.join(output), counts
+
+
+def read_chunks(file, chunk_size):
+    while True:
+        lines = list(itertools.islice(file, chunk_size))
+        if not lines:
+            return
+        yield lines
+
+
+def validate_file(input_path, output_path, database_path, workers=None, chunk_size=100_000):
+    counts = {'ok': 0, 'missing': 0, 'invalid': 0}
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers, initializer=open_worker, initargs=(database_path,)) as executor, \
+            open(input_path) as input_file, open(output_path, 'w') as output_file:
+        output_file.write('number,status\n')
+
+        # Results are written in input order as they complete, with a bounded
+        # number of chunks in flight so memory does not grow with the file.
+        pending = []
+        for lines in read_chunks(input_file, chunk_size):
+            pending.append(executor.submit(validate_chunk, lines))
+            if len(pending) >= 2 * workers:
+                write_result(pending.pop(0), output_file, counts)
+
+        for future in pending:
+            write_result(future, output_file, counts)
+
+    return counts
+
+
+def write_result(future, output_file, counts):
+    output, chunk_counts = future.result()
+    output_file.write(output)
+    for status, count in chunk_counts.items():
+        counts[status] += count
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check candidate card numbers, one per line, against the card table.")
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--database', default='card.s3db')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = validate_file(args.input, args.output, args.database, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    print(f"{total:,} numbers in {elapsed:.2f} s ({total / elapsed:,.0f} numbers/s)")
+    print(', '.join(f"{status}: {count:,}" for status, count in counts.items()))
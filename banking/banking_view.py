@@ -1,3 +1,7 @@
+import json
+import threading
+
+
 class Displayer:
     def display(self, message):
         print(message)
@@ -8,4 +12,39 @@ class Retriever:
         self.ask_function = ask_function
 
     def retrieve(self, question):
-        return self.ask_function(question)
\ No newline at end of file
+        return self.ask_function(question)
+
+
+class RecordingRetriever(Retriever):
+    # Keeps every answer of a session; save() appends them to path as one
+    # JSON line, so a file collects sessions to replay later.
+    file_lock = threading.Lock()
+
+    def __init__(self, ask_function, path):
+        super().__init__(ask_function)
+        self.path = path
+        self.inputs = []
+
+    def retrieve(self, question):
+        answer = self.ask_function(question)
+        self.inputs.append(answer)
+        return answer
+
+    def save(self):
+        line = json.dumps({'inputs': self.inputs}) + '\n'
+        with self.file_lock, open(self.path, 'a') as file:
+            file.write(line)
+        return
+
+
+class AsyncDisplayer(Displayer):
+    def __init__(self, write_function):
+        self.write_function = write_function
+
+    async def display(self, message):
+        await self.write_function(message)
+
+
+class AsyncRetriever(Retriever):
+    async def retrieve(self, question):
+        return await self.ask_function(question)
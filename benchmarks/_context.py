@@ -0,0 +1,4 @@
+import sys
+
+sys.path.append('../')
+sys.path.append('../banking')
\ No newline at end of file
@@ -0,0 +1,42 @@
+import _context
+import argparse
+import itertools
+import random
+import time
+from banking.banking_model import CachedCardDataBase, CardDataBaseSqlite3, CardFactory, Logger
+
+
+def zipf_logins(cards, count, exponent):
+    # A few cards log in over and over, most only now and then.
+    weights = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(cards) + 1)))
+    return random.choices(cards, cum_weights=weights, k=count)
+
+
+def run_logins(logger, logins):
+    start = time.perf_counter()
+    for card in logins:
+        logger.log_to(card.number, card.pin)
+    return len(logins) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Login throughput with and without the card cache.")
+    parser.add_argument('--cards', type=int, default=100_000)
+    parser.add_argument('--logins', type=int, default=200_000)
+    parser.add_argument('--exponent', type=float, default=1.1)
+    parser.add_argument('--cache-size', type=int, nargs='+', default=[1_000, 10_000])
+    args = parser.parse_args()
+
+    card_data_base = CardDataBaseSqlite3(':memory:')
+    cards = list(CardFactory(card_data_base).new_cards(args.cards))
+    logins = zipf_logins(cards, args.logins, args.exponent)
+
+    print(f"uncached: {run_logins(Logger(card_data_base), logins):>10,.0f} logins/s")
+    for cache_size in args.cache_size:
+        cached = CachedCardDataBase(card_data_base, max_size=cache_size)
+        rate = run_logins(Logger(cached), logins)
+        info = cached.cache_info()
+        print(
+            f"cache {cache_size:>7,}: {rate:>10,.0f} logins/s  "
+            f"hit rate {info['hits'] / (info['hits'] + info['misses']):.1%}  evictions {info['evictions']:,}"
+        )
@@ -0,0 +1,43 @@
+import _context
+import argparse
+import tracemalloc
+from banking.banking_model import Card, CardTable
+
+
+class DictAccount:
+    # Card and Account as they were before __slots__, kept as the baseline.
+    def __init__(self, balance=0):
+        self.balance = balance
+
+
+class DictCard:
+    def __init__(self, number, pin):
+        self.number = number
+        self.pin = pin
+        self.account = DictAccount()
+
+
+def measure(build):
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Memory per million cards for each card representation.")
+    parser.add_argument('--cards', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    first = 4000_0000_0000_0000
+    numbers = range(first, first + args.cards * 10, 10)
+    layouts = [
+        ('Card with __dict__', lambda: [DictCard(number, 1234) for number in numbers]),
+        ('Card with __slots__', lambda: [Card(number, 1234) for number in numbers]),
+        ('CardTable', lambda: CardTable(Card(number, 1234) for number in numbers)),
+    ]
+    for name, build in layouts:
+        size = measure(build)
+        print(f"{name:<20} {size / args.cards * 1_000_000 / 2**20:>8,.1f} MiB per million cards")
@@ -0,0 +1,47 @@
+import _context
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from banking.banking_model import CardDataBaseSqlite3, CardFactory
+
+
+def timed(function, *arguments, trace_memory=False):
+    # Tracing slows every allocation down, so rates are only meaningful without it.
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    count = function(*arguments)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return count / elapsed, peak
+
+
+def describe(rate, peak):
+    return f"{rate:>10,.0f} rows/s" + ('' if peak is None else f" (peak {peak / 2**20:.1f} MiB)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Card export and import throughput and peak memory.")
+    parser.add_argument('--cards', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=1_000)
+    parser.add_argument('--trace-memory', action='store_true', help="report peak Python memory, slows everything down")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = CardDataBaseSqlite3(os.path.join(directory, 'source.s3db'))
+        CardFactory(source).new_cards(args.cards)
+
+        for file_format in ('csv', 'jsonl'):
+            path = os.path.join(directory, 'cards.' + file_format)
+            target = CardDataBaseSqlite3(os.path.join(directory, file_format + '.s3db'))
+            exported = timed(source.export_cards, path, None, args.batch_size, trace_memory=args.trace_memory)
+            imported = timed(target.import_cards, path, None, args.batch_size, trace_memory=args.trace_memory)
+            target.close()
+            print(f"{file_format:<5} export {describe(*exported)}  import {describe(*imported)}")
+
+        source.close()
@@ -0,0 +1,40 @@
+import _context
+import argparse
+import os
+import tempfile
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardFactory
+
+
+def bench_group_commit(commit_every, synchronous, writes):
+    with tempfile.TemporaryDirectory() as directory:
+        card_data_base = CardDataBaseSqlite3(
+            os.path.join(directory, 'card.s3db'),
+            commit_every=commit_every,
+            synchronous=synchronous
+        )
+        card = next(CardFactory(card_data_base).new_cards(1))
+
+        start = time.perf_counter()
+        for _ in range(writes):
+            card.account.deposit(1)
+            card_data_base.update_card(card)
+        card_data_base.flush()
+        elapsed = time.perf_counter() - start
+
+        card_data_base.close()
+
+    return writes / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="update_card throughput by group commit size and synchronous level.")
+    parser.add_argument('--commit-every', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--synchronous', nargs='+', default=['FULL', 'NORMAL', 'OFF'])
+    parser.add_argument('--writes', type=int, default=5_000)
+    args = parser.parse_args()
+
+    for synchronous in args.synchronous:
+        for commit_every in args.commit_every:
+            throughput = bench_group_commit(commit_every, synchronous, args.writes)
+            print(f"synchronous={synchronous:<6} commit_every={commit_every:<5} {throughput:>12,.0f} writes/s")
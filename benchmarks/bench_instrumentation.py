@@ -0,0 +1,40 @@
+import _context
+import argparse
+import random
+import statistics
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardFactory, InstrumentedCardDataBase
+
+
+def time_calls(function, numbers, *arguments):
+    start = time.perf_counter()
+    for number in numbers:
+        function(number, *arguments)
+    return (time.perf_counter() - start) / len(numbers) * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cost of the instrumentation wrapper on get_card and deposit.")
+    parser.add_argument('--cards', type=int, default=100_000)
+    parser.add_argument('--operations', type=int, default=20_000, help="calls per round")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    card_data_base = CardDataBaseSqlite3(':memory:', commit_every=1_000)
+    numbers = [card.number for card in CardFactory(card_data_base).new_cards(args.cards)]
+    instrumented = InstrumentedCardDataBase(card_data_base)
+
+    # Plain and instrumented calls take turns in random order on the same
+    # database, so table growth and machine noise hit both sides alike.
+    timings = {(name, method): [] for name in ('plain', 'instrumented') for method in ('get_card', 'deposit')}
+    for _ in range(args.rounds):
+        sample = random.choices(numbers, k=args.operations)
+        for name, target in random.sample([('plain', card_data_base), ('instrumented', instrumented)], 2):
+            timings[name, 'get_card'].append(time_calls(target.get_card, sample))
+            timings[name, 'deposit'].append(time_calls(target.deposit, sample, 1))
+
+    for method in ('get_card', 'deposit'):
+        plain = statistics.median(timings['plain', method])
+        timed = statistics.median(timings['instrumented', method])
+        print(f"{method:<9} plain {plain:.2f} us  instrumented {timed:.2f} us  ({(timed - plain) / plain:+.1%})")
+    print(instrumented.summary())
@@ -0,0 +1,63 @@
+import _context
+import argparse
+import os
+import tempfile
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardFactory
+
+
+def fill_card_table(path, size):
+    card_data_base = CardDataBaseSqlite3(path)
+    card_data_base.connection.executemany(
+        "INSERT INTO card (number, pin, balance) VALUES (?, ?, 0)",
+        ((4000_0000_0000_0000 + 10 * customer_id, customer_id % 10_000) for customer_id in range(1, size + 1))
+    )
+    # Rows inserted behind add_cards' back: move the allocation high-water mark past them.
+    card_data_base.advance_sequence((4000_0000_0000_0000 + 10 * size,))
+    card_data_base.connection.commit()
+    return card_data_base
+
+
+def bench_issuance(size, repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        card_data_base = fill_card_table(os.path.join(directory, 'card.s3db'), size)
+        card_factory = CardFactory(card_data_base)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            card_factory.new_card()
+        elapsed = time.perf_counter() - start
+
+        card_data_base.connection.close()
+
+    return elapsed / repeat
+
+
+def bench_bulk_issuance(count):
+    with tempfile.TemporaryDirectory() as directory:
+        card_data_base = CardDataBaseSqlite3(os.path.join(directory, 'card.s3db'))
+        card_factory = CardFactory(card_data_base)
+
+        start = time.perf_counter()
+        for _ in card_factory.new_cards(count):
+            pass
+        elapsed = time.perf_counter() - start
+
+        card_data_base.connection.close()
+
+    return count / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Card issuance latency against a pre-filled card table, and bulk issuance throughput.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--bulk', type=int, default=500_000, help="cards issued at once with new_cards")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        latency = bench_issuance(size, args.repeat)
+        print(f"{size:>12,} rows: {latency * 1e3:8.3f} ms/card")
+
+    throughput = bench_bulk_issuance(args.bulk)
+    print(f"{args.bulk:>12,} cards in bulk: {throughput:,.0f} cards/s")
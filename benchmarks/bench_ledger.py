@@ -0,0 +1,45 @@
+import _context
+import argparse
+import os
+import random
+import tempfile
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardFactory
+
+
+def bench_ledger(cards, transfers, commit_every, history_queries):
+    with tempfile.TemporaryDirectory() as directory:
+        card_data_base = CardDataBaseSqlite3(
+            os.path.join(directory, 'card.s3db'), commit_every=commit_every, profile='wal'
+        )
+        numbers = [card.number for card in CardFactory(card_data_base).new_cards(cards)]
+        card_data_base.apply_balance_deltas({number: transfers for number in numbers})
+
+        start = time.perf_counter()
+        for _ in range(transfers):
+            source, target = random.sample(numbers, 2)
+            card_data_base.transfer(source, target, 1)
+        card_data_base.flush()
+        transfer_rate = transfers / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(history_queries):
+            card_data_base.get_history(random.choice(numbers))
+        history_rate = history_queries / (time.perf_counter() - start)
+
+        card_data_base.close()
+
+    return transfer_rate, history_rate
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Transfer throughput with ledger rows, and recent history lookups.")
+    parser.add_argument('--cards', type=int, default=10_000)
+    parser.add_argument('--transfers', type=int, default=20_000)
+    parser.add_argument('--commit-every', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--history-queries', type=int, default=20_000)
+    args = parser.parse_args()
+
+    for commit_every in args.commit_every:
+        transfer_rate, history_rate = bench_ledger(args.cards, args.transfers, commit_every, args.history_queries)
+        print(f"commit_every={commit_every:<5} {transfer_rate:>10,.0f} transfers/s  {history_rate:>10,.0f} history queries/s")
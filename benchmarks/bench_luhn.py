@@ -0,0 +1,59 @@
+import _context
+import argparse
+import random
+import time
+from banking.banking_model import CardDataBase, CardFactory
+
+
+def string_compute_check_sum(issuer_identification_number, customer_id):
+    # The original string based routine, kept as the baseline.
+    initial_number = str(issuer_identification_number) + str(customer_id).zfill(9)
+    output_number = ''
+    for i, digit in enumerate(initial_number):
+        if i % 2 == 0:
+            double = 2 * int(digit)
+            if double >= 10:
+                double -= 9
+
+            output_number += str(double)
+        else:
+            output_number += digit
+
+    sum = 0
+    for digit in output_number:
+        sum += int(digit)
+
+    return (10 - sum % 10) % 10
+
+
+def string_is_valid(number):
+    check_sum = string_compute_check_sum(int(str(number)[:6]), int(str(number)[6:-1]))
+    return check_sum == int(str(number)[-1])
+
+
+def throughput(function, count):
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="String, integer and batch Luhn validation and check digits.")
+    parser.add_argument('--numbers', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    card_factory = CardFactory(CardDataBase())
+    numbers = [random.randrange(10**15, 10**16) for _ in range(args.numbers)]
+    customer_ids = [random.randrange(10**9) for _ in range(args.numbers)]
+    prefixes = [400000 * 10**9 + customer_id for customer_id in customer_ids]
+
+    benchmarks = [
+        ("string is_valid", lambda: [string_is_valid(number) for number in numbers]),
+        ("is_valid", lambda: [card_factory.is_valid(number) for number in numbers]),
+        ("is_valid_many", lambda: card_factory.is_valid_many(numbers)),
+        ("string check sum", lambda: [string_compute_check_sum(400000, customer_id) for customer_id in customer_ids]),
+        ("compute_check_sum", lambda: [card_factory.compute_check_sum(400000, customer_id) for customer_id in customer_ids]),
+        ("check_digits_many", lambda: card_factory.check_digits_many(prefixes)),
+    ]
+    for name, function in benchmarks:
+        print(f"{name:<18} {throughput(function, args.numbers):>14,.0f} numbers/s")
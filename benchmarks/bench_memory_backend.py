@@ -0,0 +1,49 @@
+import _context
+import argparse
+import random
+import time
+from banking.banking_model import CardDataBase, CardFactory
+
+
+class ListCardDataBase:
+    # The former list backed lookup, kept as the baseline.
+    def __init__(self, cards):
+        self.cards = list(cards)
+
+    def get_card(self, number):
+        for card in self.cards:
+            if card.number == number:
+                return card
+
+        raise ValueError("No such card (number: {} )in database!".format(number))
+
+
+def rate(function, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return len(arguments) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Lookup and update throughput of the in-memory card database.")
+    parser.add_argument('--cards', type=int, default=10_000_000)
+    parser.add_argument('--operations', type=int, default=1_000_000)
+    parser.add_argument('--list-cards', type=int, default=10_000, help="size of the linear scan baseline")
+    args = parser.parse_args()
+
+    card_data_base = CardDataBase()
+    start = time.perf_counter()
+    cards = list(CardFactory(card_data_base).new_cards(args.cards))
+    print(f"issued {args.cards:,} cards in {time.perf_counter() - start:.1f} s")
+
+    sample = random.choices(cards, k=args.operations)
+    numbers = [card.number for card in sample]
+    print(f"get_card:    {rate(card_data_base.get_card, numbers):>12,.0f} ops/s")
+    print(f"is_card:     {rate(card_data_base.is_card, sample):>12,.0f} ops/s")
+    print(f"update_card: {rate(card_data_base.update_card, sample):>12,.0f} ops/s")
+    print(f"last card:   {rate(lambda _: card_data_base.get_last_emitted_card(), sample):>12,.0f} ops/s")
+
+    baseline = ListCardDataBase(cards[:args.list_cards])
+    numbers = [card.number for card in random.choices(cards[:args.list_cards], k=1_000)]
+    print(f"list scan of {args.list_cards:,} cards: {rate(baseline.get_card, numbers):>12,.0f} ops/s")
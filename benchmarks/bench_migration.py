@@ -0,0 +1,49 @@
+import _context
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from banking.banking_model import CardDataBaseSqlite3
+
+
+def create_legacy_file(path, size):
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE card(\n" +
+        "   id INTEGER,\n" +
+        "   number TEXT,\n" +
+        "   pin TEXT,\n" +
+        "   balance INTEGER DEFAULT 0\n" +
+        ")"
+    )
+    connection.executemany(
+        "INSERT INTO card (number, pin, balance) VALUES (?, ?, 0)",
+        ((str(4000_0000_0000_0000 + 10 * customer_id), str(customer_id % 10_000)) for customer_id in range(1, size + 1))
+    )
+    connection.commit()
+    connection.close()
+
+
+def bench_migration(size):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'card.s3db')
+        create_legacy_file(path, size)
+
+        start = time.perf_counter()
+        card_data_base = CardDataBaseSqlite3(path)
+        elapsed = time.perf_counter() - start
+
+        card_data_base.connection.close()
+
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="In-place upgrade time of a legacy card.s3db file.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5_000_000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        elapsed = bench_migration(size)
+        print(f"{size:>12,} rows: {elapsed:8.2f} s ({size / elapsed:,.0f} rows/s)")
@@ -0,0 +1,63 @@
+import _context
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardDataBaseSqlite3Pool, CardFactory
+
+
+class LockedCardDataBaseSqlite3(CardDataBaseSqlite3):
+    # The baseline: one connection shared by every thread behind a lock.
+    def __init__(self, path):
+        super().__init__(path, profile='wal', check_same_thread=False)
+        self.shared_lock = threading.Lock()
+
+    def get_card(self, number):
+        with self.shared_lock:
+            return super().get_card(number)
+
+    def update_card(self, card):
+        with self.shared_lock:
+            return super().update_card(card)
+
+
+def run_workload(card_data_base, numbers, threads, operations, write_ratio):
+    def work():
+        for _ in range(operations):
+            card = card_data_base.get_card(random.choice(numbers))
+            if random.random() < write_ratio:
+                card.account.deposit(1)
+                card_data_base.update_card(card)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * operations / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mixed read/write throughput from many threads.")
+    parser.add_argument('--cards', type=int, default=100_000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--operations', type=int, default=5_000, help="operations per thread")
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'card.s3db')
+        pool = CardDataBaseSqlite3Pool(path)
+        numbers = [card.number for card in CardFactory(pool).new_cards(args.cards)]
+        locked = LockedCardDataBaseSqlite3(path)
+
+        for threads in args.threads:
+            shared = run_workload(locked, numbers, threads, args.operations, args.write_ratio)
+            pooled = run_workload(pool, numbers, threads, args.operations, args.write_ratio)
+            print(f"{threads:>3} threads  shared connection: {shared:>10,.0f} ops/s  pool: {pooled:>10,.0f} ops/s")
+
+        locked.close()
+        pool.close()
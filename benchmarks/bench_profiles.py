@@ -0,0 +1,64 @@
+import _context
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardFactory, PRAGMA_PROFILES
+
+
+def bench_profile(profile, cards, readers, duration):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'card.s3db')
+        card_data_base = CardDataBaseSqlite3(path, profile=profile)
+        numbers = [card.number for card in CardFactory(card_data_base).new_cards(cards)]
+        card_data_base.close()
+
+        counts = {'reads': 0, 'writes': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def read():
+            reader = CardDataBaseSqlite3(path, profile=profile)
+            done = 0
+            while not stop.is_set():
+                reader.get_card(random.choice(numbers))
+                done += 1
+            reader.close()
+            with lock:
+                counts['reads'] += done
+
+        def write():
+            writer = CardDataBaseSqlite3(path, profile=profile)
+            done = 0
+            while not stop.is_set():
+                card = writer.get_card(random.choice(numbers))
+                card.account.deposit(1)
+                writer.update_card(card)
+                done += 1
+            writer.close()
+            counts['writes'] = done
+
+        threads = [threading.Thread(target=read) for _ in range(readers)] + [threading.Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    return counts['reads'] / duration, counts['writes'] / duration
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Read/write throughput with one writer and concurrent readers.")
+    parser.add_argument('--profiles', nargs='+', default=list(PRAGMA_PROFILES))
+    parser.add_argument('--cards', type=int, default=100_000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        reads, writes = bench_profile(profile, args.cards, args.readers, args.duration)
+        print(f"{profile:<8} {reads:>12,.0f} reads/s {writes:>10,.0f} writes/s")
@@ -0,0 +1,54 @@
+import _context
+import argparse
+import os
+import random
+import tempfile
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardFactory, LedgerSettler
+
+
+def prepare(path, cards):
+    card_data_base = CardDataBaseSqlite3(path)
+    card_factory = CardFactory(card_data_base)
+    numbers = [card.number for card in card_factory.new_cards(cards)]
+    card_data_base.apply_balance_deltas({number: 1_000 for number in numbers})
+    return card_data_base, card_factory, numbers
+
+
+def random_transfers(numbers, count):
+    return [(*random.sample(numbers, 2), random.randint(1, 100)) for _ in range(count)]
+
+
+def bench_one_by_one(card_data_base, transfers):
+    start = time.perf_counter()
+    for source, target, amount in transfers:
+        try:
+            card_data_base.transfer(source, target, amount)
+        except ValueError:
+            pass
+    return len(transfers) / (time.perf_counter() - start)
+
+
+def bench_settle(card_data_base, card_factory, transfers):
+    start = time.perf_counter()
+    LedgerSettler(card_data_base, card_factory).settle(transfers)
+    return len(transfers) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ledger settlement throughput versus one transfer per call.")
+    parser.add_argument('--cards', type=int, default=100_000)
+    parser.add_argument('--transfers', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        card_data_base, card_factory, numbers = prepare(os.path.join(directory, 'card.s3db'), args.cards)
+        transfers = random_transfers(numbers, args.transfers)
+
+        # One commit per transfer is slow, so it only replays a sample.
+        one_by_one = bench_one_by_one(card_data_base, transfers[:min(len(transfers), 2_000)])
+        settled = bench_settle(card_data_base, card_factory, transfers)
+        card_data_base.close()
+
+    print(f"transfer() one by one: {one_by_one:>12,.0f} transfers/s")
+    print(f"LedgerSettler.settle:  {settled:>12,.0f} transfers/s")
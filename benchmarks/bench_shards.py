@@ -0,0 +1,45 @@
+import _context
+import argparse
+import os
+import tempfile
+import threading
+import time
+from banking.banking_model import CardFactory, ShardedCardDataBase
+
+
+def bench_shards(shards, threads, cards, synchronous):
+    with tempfile.TemporaryDirectory() as directory:
+        card_data_base = ShardedCardDataBase(
+            [os.path.join(directory, f'card_{index}.s3db') for index in range(shards)],
+            synchronous=synchronous,
+            check_same_thread=False
+        )
+        card_factory = CardFactory(card_data_base)
+
+        def issue():
+            for _ in range(cards):
+                card_factory.new_card()
+
+        workers = [threading.Thread(target=issue) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        card_data_base.close()
+
+    return threads * cards / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Card issuance throughput by shard count, one writer thread per shard.")
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--cards', type=int, default=500, help="cards issued per thread")
+    parser.add_argument('--synchronous', default='FULL')
+    args = parser.parse_args()
+
+    for shards in args.shards:
+        throughput = bench_shards(shards, shards, args.cards, args.synchronous)
+        print(f"{shards:>3} shards: {throughput:>10,.0f} cards/s")
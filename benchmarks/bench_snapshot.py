@@ -0,0 +1,61 @@
+import _context
+import argparse
+import os
+import random
+import tempfile
+import time
+from banking.banking_model import Card, CardDataBase, CardDataBaseSqlite3, CardFactory, CardSnapshot
+
+
+def load_from_sqlite(card_data_base):
+    # The baseline warm start: replay every row through Card construction.
+    memory = CardDataBase()
+    cursor = card_data_base.connection.execute("SELECT number, pin, balance FROM card ORDER BY id")
+    for number, pin, balance in cursor:
+        card = Card(int(number), int(pin))
+        card.account.balance = balance
+        memory.add_card(card)
+    return memory
+
+
+def timed(function, *arguments):
+    start = time.perf_counter()
+    result = function(*arguments)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cold start from sqlite against cold start from a binary snapshot.")
+    parser.add_argument('--cards', type=int, default=10_000_000)
+    parser.add_argument('--lookups', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        card_data_base = CardDataBaseSqlite3(os.path.join(directory, 'card.s3db'))
+        CardFactory(card_data_base).new_cards(args.cards)
+        card_data_base.flush()
+
+        path = os.path.join(directory, 'cards.snapshot')
+        _, elapsed = timed(card_data_base.write_snapshot, path)
+        print(f"write snapshot:        {elapsed:>7.2f} s  ({os.path.getsize(path) / 2**20:,.0f} MiB)")
+
+        _, elapsed = timed(load_from_sqlite, card_data_base)
+        print(f"sqlite -> CardDataBase: {elapsed:>6.2f} s")
+
+        snapshot, elapsed = timed(CardSnapshot, path)
+        print(f"open snapshot:         {elapsed:>7.4f} s")
+
+        numbers = [snapshot.numbers[random.randrange(len(snapshot))] for _ in range(args.lookups)]
+        _, elapsed = timed(lambda: [snapshot.get_card(number) for number in numbers])
+        print(f"snapshot lookups:      {args.lookups / elapsed:>10,.0f} ops/s")
+
+        card_table, elapsed = timed(snapshot.to_card_table)
+        print(f"snapshot -> CardTable: {elapsed:>7.2f} s")
+
+        memory = CardDataBase()
+        _, elapsed = timed(memory.add_cards, snapshot.to_cards())
+        print(f"snapshot -> CardDataBase: {elapsed:>4.2f} s")
+
+        del numbers, card_table
+        snapshot.close()
+        card_data_base.close()
@@ -0,0 +1,63 @@
+import _context
+import argparse
+import random
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardFactory
+
+
+def interpolated_get_card(card_data_base, number):
+    card_data_base.cursor.execute(f"SELECT number, pin, balance FROM card WHERE number={number};")
+    return card_data_base.cursor.fetchone()
+
+
+def interpolated_update_card(card_data_base, card):
+    card_data_base.cursor.execute(
+        f"UPDATE card SET number = {card.number}, pin = {card.pin}, balance = {card.account.balance} "
+        f"WHERE number = {card.number};"
+    )
+
+
+def parameterized_get_card(card_data_base, number):
+    return card_data_base.get_card(number)
+
+
+def parameterized_update_card(card_data_base, card):
+    card_data_base.cursor.execute(
+        "UPDATE card SET\n" +
+        "  pin = ?,\n" +
+        "  balance = ?\n" +
+        "WHERE\n" +
+        "  number = ?\n" +
+        ";",
+        (card.pin, card.account.balance, card.number)
+    )
+
+
+def time_per_operation(operation, card_data_base, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        operation(card_data_base, argument)
+    return (time.perf_counter() - start) / len(arguments)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-operation latency of interpolated versus parameterized SQL.")
+    parser.add_argument('--cards', type=int, default=100_000)
+    parser.add_argument('--operations', type=int, default=100_000)
+    args = parser.parse_args()
+
+    card_data_base = CardDataBaseSqlite3(':memory:')
+    cards = list(CardFactory(card_data_base).new_cards(args.cards))
+    sample = random.choices(cards, k=args.operations)
+    numbers = [card.number for card in sample]
+
+    # Updates are timed without their commit so that only statement preparation differs.
+    benchmarks = [
+        ("get_card", interpolated_get_card, parameterized_get_card, numbers),
+        ("update_card", interpolated_update_card, parameterized_update_card, sample),
+    ]
+    for name, interpolated, parameterized, arguments in benchmarks:
+        before = time_per_operation(interpolated, card_data_base, arguments)
+        after = time_per_operation(parameterized, card_data_base, arguments)
+        print(f"{name:<12} interpolated: {before * 1e6:7.2f} us/op  parameterized: {after * 1e6:7.2f} us/op")
+    card_data_base.connection.rollback()
@@ -0,0 +1,39 @@
+import _context
+import argparse
+import os
+import random
+import tempfile
+import time
+from banking.banking_model import CardDataBaseSqlite3, CardFactory
+from banking.banking_validate import validate_file
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk validation throughput by number of worker processes.")
+    parser.add_argument('--cards', type=int, default=1_000_000)
+    parser.add_argument('--candidates', type=int, default=2_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, 'card.s3db')
+        card_data_base = CardDataBaseSqlite3(database_path)
+        numbers = [card.number for card in CardFactory(card_data_base).new_cards(args.cards)]
+        card_data_base.close()
+
+        # Half issued numbers, half random 16 digit candidates.
+        input_path = os.path.join(directory, 'input.txt')
+        with open(input_path, 'w') as file:
+            for _ in range(args.candidates):
+                if random.random() < 0.5:
+                    file.write(f"{random.choice(numbers)}\n")
+                else:
+                    file.write(f"{random.randrange(10**15, 10**16)}\n")
+
+        output_path = os.path.join(directory, 'output.csv')
+        for workers in args.workers:
+            start = time.perf_counter()
+            counts = validate_file(input_path, output_path, database_path, workers, args.chunk_size)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>3} workers: {args.candidates / elapsed:>12,.0f} numbers/s  {counts}")
@@ -0,0 +1,86 @@
+import _context
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import tempfile
+import time
+from banking.banking_server import BankingServer
+
+
+async def answer(reader, writer, line):
+    output = (await reader.readuntil(b'> ')).decode()
+    writer.write(line.encode() + b'\n')
+    await writer.drain()
+    return output
+
+
+async def simulated_client(host, port, latencies):
+    # Create an account, log into it, check the balance, add income, exit.
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.readuntil(b'> ')
+
+    async def act(*lines):
+        start = time.perf_counter()
+        output = ''
+        for line in lines:
+            writer.write(line.encode() + b'\n')
+            await writer.drain()
+            output += (await reader.readuntil(b'> ')).decode()
+        latencies.append(time.perf_counter() - start)
+        return output
+
+    output = await act('1')
+    number = re.findall(r'^400000\d{10}$', output, re.MULTILINE)[0]
+    pin = re.findall(r'^\d{4}$', output, re.MULTILINE)[0]
+    await act('2', number, pin)
+    await act('1')
+    await act('2', '100')
+    await act('1')
+    writer.write(b'0\n')
+    await writer.drain()
+    await reader.read()
+    writer.close()
+
+
+async def run_load(host, port, clients):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(simulated_client(host, port, latencies) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+async def main(args):
+    banking_server = None
+    host, port = args.host, args.port
+    directory = tempfile.TemporaryDirectory()
+    if port is None:
+        banking_server = BankingServer(os.path.join(directory.name, 'card.s3db'), 'wal', args.clients)
+        port = await banking_server.start(host, 0)
+
+    try:
+        elapsed, latencies = await run_load(host, port, args.clients)
+    finally:
+        if banking_server is not None:
+            await banking_server.close()
+        directory.cleanup()
+
+    latencies.sort()
+    print(f"{args.clients:,} sessions in {elapsed:.2f} s ({args.clients / elapsed:,.0f} sessions/s)")
+    print(
+        f"{len(latencies):,} actions: {len(latencies) / elapsed:,.0f} actions/s, "
+        f"p50 {statistics.median(latencies) * 1e3:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f} ms"
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Open N simulated terminals against a banking server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help="server to load, default: start one in process")
+    parser.add_argument('--clients', type=int, default=1000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
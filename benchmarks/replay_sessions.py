@@ -0,0 +1,138 @@
+import _context
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from banking.banking_controller import LoggedInController, MainMenuController, run_session
+from banking.banking_view import Displayer, Retriever
+from banking.banking_model import CardDataBaseSqlite3Pool, CardFactory, Logger
+
+
+class NullDisplayer(Displayer):
+    def display(self, message):
+        pass
+
+
+# Menu prompt -> {choice: action name}, taken from the controllers' own choices.
+MENUS = {}
+for controller in (MainMenuController(None, None, None, None), LoggedInController(None, None, None, None, None)):
+    MENUS[controller.choices_message()] = {
+        choice.split('.')[0]: choice.split('. ', 1)[1] for choice in controller.choices
+    }
+
+
+class ReplayRetriever(Retriever):
+    # Answers with the recorded inputs. An action is timed from the menu choice
+    # until the next menu prompt, or the end of the session.
+    def __init__(self, inputs, latencies):
+        super().__init__(None)
+        self.inputs = iter(inputs)
+        self.latencies = latencies
+        self.action = None
+        self.action_start = None
+
+    def retrieve(self, question):
+        now = time.perf_counter()
+        menu = MENUS.get(question)
+        if menu is not None:
+            self.finish_action(now)
+
+        try:
+            answer = next(self.inputs)
+        except StopIteration:
+            raise EOFError("Recorded session is over!")
+
+        if menu is not None:
+            self.action = menu.get(answer, 'Unknown choice')
+            self.action_start = time.perf_counter()
+        return answer
+
+    def finish_action(self, now=None):
+        if self.action is not None:
+            now = time.perf_counter() if now is None else now
+            self.latencies.append((self.action, now - self.action_start))
+            self.action = None
+        return
+
+
+def load_sessions(path):
+    with open(path) as file:
+        return [json.loads(line)['inputs'] for line in file if line.strip()]
+
+
+def clone_database(source, target):
+    # The sqlite backup API copies a consistent snapshot, even of a live database.
+    source_connection, target_connection = sqlite3.connect(source), sqlite3.connect(target)
+    source_connection.backup(target_connection)
+    source_connection.close()
+    target_connection.close()
+    return
+
+
+def replay(sessions, card_data_base, workers):
+    card_factory = CardFactory(card_data_base)
+    logger = Logger(card_data_base)
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def replay_session(inputs):
+        session_latencies = []
+        retriever = ReplayRetriever(inputs, session_latencies)
+        try:
+            run_session(NullDisplayer(), retriever, card_data_base, card_factory, logger)
+        except (EOFError, ValueError):
+            pass
+        retriever.finish_action()
+        with latencies_lock:
+            latencies.extend(session_latencies)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        for _ in executor.map(replay_session, sessions):
+            pass
+
+    return time.perf_counter() - start, latencies
+
+
+def report(sessions, elapsed, latencies):
+    print(f"{len(sessions):,} sessions in {elapsed:.2f} s ({len(sessions) / elapsed:,.0f} sessions/s)")
+    by_action = {}
+    for action, latency in latencies:
+        by_action.setdefault(action, []).append(latency)
+
+    for action, action_latencies in sorted(by_action.items()):
+        action_latencies.sort()
+        print(
+            f"{action:<20} {len(action_latencies):>9,} actions {len(action_latencies) / elapsed:>10,.0f}/s  "
+            f"p50 {statistics.median(action_latencies) * 1e3:.3f} ms  "
+            f"p99 {action_latencies[int(len(action_latencies) * 0.99)] * 1e3:.3f} ms"
+        )
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay recorded banking sessions concurrently against the controllers.")
+    parser.add_argument('sessions', help="JSON lines file written by RecordingRetriever")
+    parser.add_argument('--database', help="card database to clone, default: start from an empty one")
+    parser.add_argument('--workers', type=int, default=64, help="sessions running at once")
+    parser.add_argument('--repeat', type=int, default=1, help="replay every recorded session this many times")
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.sessions) * args.repeat
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'card.s3db')
+        if args.database is not None:
+            clone_database(args.database, path)
+
+        card_data_base = CardDataBaseSqlite3Pool(path)
+        try:
+            elapsed, latencies = replay(sessions, card_data_base, args.workers)
+        finally:
+            card_data_base.close()
+
+    report(sessions, elapsed, latencies)
@@ -0,0 +1,182 @@
+import _context
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from banking.banking_controller import run_session
+from banking.banking_view import Displayer, Retriever
+from banking.banking_model import CachedCardDataBase, CardDataBase, CardDataBaseSqlite3, CardFactory, Logger
+
+
+class NullDisplayer(Displayer):
+    def display(self, message):
+        pass
+
+
+BACKENDS = {
+    'memory': lambda directory: CardDataBase(),
+    'sqlite': lambda directory: CardDataBaseSqlite3(os.path.join(directory, 'card.s3db')),
+    'sqlite-wal': lambda directory: CardDataBaseSqlite3(os.path.join(directory, 'card.s3db'), profile='wal'),
+    'sqlite-cached': lambda directory: CachedCardDataBase(CardDataBaseSqlite3(os.path.join(directory, 'card.s3db'))),
+}
+
+
+# Every operation takes the prepared dataset and returns the call to time.
+def issuance(dataset):
+    return lambda card: dataset['card_factory'].new_card()
+
+
+def login(dataset):
+    return lambda card: dataset['logger'].log_to(card.number, card.pin)
+
+
+def balance(dataset):
+    return lambda card: dataset['card_data_base'].get_card(card.number).account.balance
+
+
+def update(dataset):
+    def update_card(card):
+        card.account.balance += 1
+        dataset['card_data_base'].update_card(card)
+    return update_card
+
+
+def deposit(dataset):
+    return lambda card: dataset['card_data_base'].deposit(card.number, 1)
+
+
+def transfer(dataset):
+    cards = dataset['cards']
+    return lambda card: dataset['card_data_base'].transfer(card.number, random.choice(cards).number, 1)
+
+
+def session(dataset):
+    # Log in, check the balance, add income and exit, through the controllers.
+    def run(card):
+        user_inputs = iter(['2', str(card.number), str(card.pin).zfill(4), '1', '2', '10', '0'])
+        run_session(
+            NullDisplayer(),
+            Retriever(lambda question: next(user_inputs)),
+            dataset['card_data_base'],
+            dataset['card_factory'],
+            dataset['logger']
+        )
+    return run
+
+
+OPERATIONS = {
+    'issuance': issuance,
+    'login': login,
+    'balance': balance,
+    'update': update,
+    'deposit': deposit,
+    'transfer': transfer,
+    'session': session,
+}
+
+
+def prepare(backend, size, directory):
+    card_data_base = BACKENDS[backend](directory)
+    card_factory = CardFactory(card_data_base)
+    cards = list(card_factory.new_cards(size))
+    card_data_base.apply_balance_deltas({card.number: 1_000_000 for card in cards})
+    for card in cards:
+        card.account.balance = 1_000_000
+
+    return {
+        'card_data_base': card_data_base,
+        'card_factory': card_factory,
+        'logger': Logger(card_data_base),
+        'cards': cards,
+    }
+
+
+def measure(operation, cards):
+    latencies = []
+    start = time.perf_counter()
+    for card in cards:
+        call_start = time.perf_counter()
+        operation(card)
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'operations': len(latencies),
+        'ops_per_second': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1e3,
+        'p99_ms': latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1e3,
+    }
+
+
+def run_suite(backends, sizes, operations, repeat):
+    results = []
+    for backend in backends:
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as directory:
+                dataset = prepare(backend, size, directory)
+                for name in operations:
+                    cards = random.choices(dataset['cards'], k=repeat)
+                    result = {'backend': backend, 'size': size, 'operation': name}
+                    result.update(measure(OPERATIONS[name](dataset), cards))
+                    results.append(result)
+                    print(
+                        f"{backend:<14} {size:>10,} {name:<9} {result['ops_per_second']:>12,.0f} ops/s  "
+                        f"p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms"
+                    )
+
+                close = getattr(dataset['card_data_base'], 'close', None)
+                if close is not None:
+                    close()
+
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    # A run regresses when its throughput falls more than threshold below the baseline's.
+    baseline = {(result['backend'], result['size'], result['operation']): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['backend'], result['size'], result['operation']))
+        if previous is not None and result['ops_per_second'] < previous['ops_per_second'] * (1 - threshold):
+            regressions.append((result, previous))
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Throughput and latency of card operations across backends and dataset sizes.")
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000])
+    parser.add_argument('--operations', nargs='+', choices=list(OPERATIONS), default=list(OPERATIONS))
+    parser.add_argument('--repeat', type=int, default=2_000, help="timed calls per operation")
+    parser.add_argument('--output', help="write the results as JSON")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="tolerated throughput drop, 0.1 is 10%%")
+    args = parser.parse_args()
+
+    results = run_suite(args.backends, args.sizes, args.operations, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'created': time.time(),
+                'results': results,
+            }, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file), args.threshold)
+        for result, previous in regressions:
+            print(
+                f"REGRESSION {result['backend']} {result['size']:,} {result['operation']}: "
+                f"{result['ops_per_second']:,.0f} ops/s, baseline {previous['ops_per_second']:,.0f} ops/s"
+            )
+        if regressions:
+            sys.exit(1)
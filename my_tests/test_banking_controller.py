@@ -1,11 +1,13 @@
 import _context
 import unittest
+import asyncio
+import itertools
 import sys
 from io import StringIO
 from unittest.mock import MagicMock, patch, Mock
-from banking.banking_controller import Controller, MainMenuController, LoggedInController
-from banking.banking_model import Card
-from banking.banking_view import Displayer, Retriever
+from banking.banking_controller import Controller, MainMenuController, LoggedInController, run_session_async
+from banking.banking_model import Card, CardDataBase, CardDataBaseSqlite3, CardFactory, Logger
+from banking.banking_view import Displayer, Retriever, AsyncDisplayer, AsyncRetriever
 
 
 
@@ -29,13 +31,16 @@ class TestPage(unittest.TestCase):
         sys.stdout = self.captured_output  # redirect stdout
 
         def get_input(message):
-            global USER_INPUT
             print(message)
-            return USER_INPUT
+            return next(self.user_inputs)
 
+        self.user_inputs = iter([])
         self.mock_displayer = MockDisplayer()
         self.mock_retriever = MockRetriever(get_input)
 
+    def script(self, *user_inputs):
+        self.user_inputs = iter(user_inputs)
+
     def tearDown(self):
         sys.stdout = self.old_stdout
 
@@ -56,8 +61,7 @@ class TestMainMenuController(TestPage):
         )
 
     def test_show_possible_choices(self):
-        global USER_INPUT
-        USER_INPUT = '1'
+        self.script('1')
         answer = self.main_menu_controller.witch_choices()
         self.assertEqual(
             "\n1. Create an account\n" +
@@ -65,16 +69,10 @@ class TestMainMenuController(TestPage):
             "0. Exit\n", self.captured_output.getvalue())
         self.captured_output.__init__()
 
-        self.assertEqual(USER_INPUT, answer)
+        self.assertEqual('1', answer)
 
     def test_main_loop_exit(self):
-        global USER_INPUT
-        USER_INPUT = 'Any thing'
-        with self.assertRaises(RecursionError):
-            self.main_menu_controller.main_loop()
-            self.assertFalse(self.main_menu_controller.is_over)
-
-        USER_INPUT = '0'
+        self.script('Any thing', 'Any thing', '0')
         self.assertIsNone(self.main_menu_controller.main_loop())
         self.assertTrue(self.main_menu_controller.is_over)
         self.assertTrue(
@@ -85,15 +83,14 @@ class TestMainMenuController(TestPage):
 
     def test_main_loop_create_account(self):
         self.captured_output.__init__()
-        global USER_INPUT
-        USER_INPUT = '1'
+        self.script('1', '1', '0')
 
-        with self.assertRaises(RecursionError):
-            card = Mock()
-            card.number = 4000_0011_1111_1112
-            card.pin = 5555
-            self.mock_card_factory.new_card = MagicMock(return_value=card)
-            self.main_menu_controller.main_loop()
+        card = Mock()
+        card.number = 4000_0011_1111_1112
+        card.pin = 5555
+        self.mock_card_factory.new_card = MagicMock(return_value=card)
+        self.assertIsNone(self.main_menu_controller.main_loop())
+        self.assertEqual(2, self.mock_card_factory.new_card.call_count)
 
         self.assertTrue(
             f"\nYour card have been created\n" +
@@ -107,9 +104,7 @@ class TestMainMenuController(TestPage):
 
     def test_main_loop_wrong_connect_to_account(self):
         self.captured_output.__init__()
-
-        global USER_INPUT
-        USER_INPUT = '2'
+        self.script('2', '4000001111111112', '5555', '0')
 
         card = Mock()
         card.number = 40000_0011_1111_1112
@@ -117,8 +112,8 @@ class TestMainMenuController(TestPage):
 
         self.mock_logger.log_to = MagicMock(return_value=card, side_effect=ValueError)
 
-        with self.assertRaises(RecursionError):
-            self.main_menu_controller.main_loop()
+        self.assertIsNone(self.main_menu_controller.main_loop())
+        self.assertTrue(self.main_menu_controller.is_over)
 
         self.assertTrue(
             f"\nEnter your card number:"
@@ -142,9 +137,7 @@ class TestMainMenuController(TestPage):
 
     def test_main_loop_right_connect_to_account(self):
         self.captured_output.__init__()
-
-        global USER_INPUT
-        USER_INPUT = '2'
+        self.script('2', '4000001111111112', '5555')
 
         card = Mock()
         card.number = 40000_0011_1111_1112
@@ -152,6 +145,8 @@ class TestMainMenuController(TestPage):
 
         self.mock_logger.log_to = MagicMock(return_value=card)
         return_card = self.main_menu_controller.main_loop()
+        self.mock_logger.log_to.assert_called_once_with(4000_0011_1111_1112, 5555)
+        self.assertFalse(self.main_menu_controller.is_over)
         self.assertTrue(
             f"\nEnter your card number:"
             in self.captured_output.getvalue()
@@ -189,8 +184,7 @@ class TestLoggedInController(TestPage):
             mock_card_factory)
 
     def test_show_possible_choices(self):
-        global USER_INPUT
-        USER_INPUT = '1'
+        self.script('1')
         answer = self.logged_in_controller.witch_choices()
         self.assertEqual(
             "\n1. Balance\n" +
@@ -201,17 +195,11 @@ class TestLoggedInController(TestPage):
             "0. Exit\n", self.captured_output.getvalue())
         self.captured_output.__init__()
 
-        self.assertEqual(USER_INPUT, answer)
+        self.assertEqual('1', answer)
 
     def test_main_loop_exit(self):
-        global USER_INPUT
-        USER_INPUT = 'Any thing'
-        with self.assertRaises(RecursionError):
-            self.assertIsNone(self.logged_in_controller.main_loop())
-            self.assertFalse(self.logged_in_controller.is_over)
-
-        USER_INPUT = '0'
-        self.logged_in_controller.main_loop()
+        self.script('Any thing', '0')
+        self.assertIsNone(self.logged_in_controller.main_loop())
         self.assertTrue(self.logged_in_controller.is_over)
         self.assertTrue(
             "Bye!"
@@ -220,8 +208,7 @@ class TestLoggedInController(TestPage):
         self.captured_output.__init__()
 
     def test_main_loop_log_out(self):
-        global USER_INPUT
-        USER_INPUT = '5'
+        self.script('5')
         self.assertIsNone(self.logged_in_controller.main_loop())
         self.assertFalse(self.logged_in_controller.is_over)
         self.assertTrue(
@@ -231,10 +218,8 @@ class TestLoggedInController(TestPage):
         self.captured_output.__init__()
 
     def test_main_loop_get_balance(self):
-        global USER_INPUT
-        USER_INPUT = 'AnyThing'
-        with self.assertRaises(RecursionError):
-            self.logged_in_controller.main_loop()
+        self.script('AnyThing', '5')
+        self.logged_in_controller.main_loop()
 
         self.assertTrue(
             "\nBalance: 99"
@@ -242,9 +227,8 @@ class TestLoggedInController(TestPage):
         )
         self.captured_output.__init__()
 
-        USER_INPUT = '1'
-        with self.assertRaises(RecursionError):
-            self.logged_in_controller.main_loop()
+        self.script('1', '5')
+        self.logged_in_controller.main_loop()
 
         self.assertTrue(
             "\nBalance: 99"
@@ -252,10 +236,8 @@ class TestLoggedInController(TestPage):
         )
 
     def test_main_loop_enter_income(self):
-        global USER_INPUT
-        USER_INPUT = 'AnyThing'
-        with self.assertRaises(RecursionError):
-            self.logged_in_controller.main_loop()
+        self.script('AnyThing', '5')
+        self.logged_in_controller.main_loop()
 
         self.assertTrue(
             "\nEnter income:"
@@ -263,9 +245,10 @@ class TestLoggedInController(TestPage):
         )
         self.captured_output.__init__()
 
-        USER_INPUT = '2'
-        with self.assertRaises(RecursionError):
-            self.logged_in_controller.main_loop()
+        self.script('2', '2', '5')
+        self.logged_in_controller.main_loop()
+        self.mock_card_data_base.deposit.assert_called_once_with(self.mock_card.number, 2)
+        self.assertIs(self.mock_card_data_base.deposit.return_value, self.mock_card.account.balance)
 
         self.assertTrue(
             "\nEnter income:"
@@ -280,11 +263,9 @@ class TestLoggedInController(TestPage):
         self.captured_output.__init__()
 
     def test_main_loop_transfer_money_invalid_number(self):
-        global USER_INPUT
-        USER_INPUT = '3'
+        self.script('3', '4000001111111113', '5')
         self.mock_card_factory.is_valid = MagicMock(return_value=False)
-        with self.assertRaises(RecursionError):
-            self.logged_in_controller.main_loop()
+        self.logged_in_controller.main_loop()
 
         self.assertTrue(
             "\nTransfer\n" +
@@ -298,12 +279,10 @@ class TestLoggedInController(TestPage):
         )
 
     def test_main_loop_transfer_money_no_card(self):
-        global USER_INPUT
-        USER_INPUT = '3'
+        self.script('3', '4000001111111112', '5')
         self.mock_card_factory.is_valid = MagicMock(return_value=True)
         self.mock_card_data_base.get_card = MagicMock(side_effect=ValueError)
-        with self.assertRaises(RecursionError):
-            self.logged_in_controller.main_loop()
+        self.logged_in_controller.main_loop()
 
         self.assertTrue(
             "\nTransfer\n" +
@@ -317,14 +296,15 @@ class TestLoggedInController(TestPage):
         )
 
     def test_main_transfer_money(self):
-        global USER_INPUT
-        USER_INPUT = '3'
+        self.script('3', '4000001111111112', '9', '5')
         self.mock_card_factory.is_valid = MagicMock(return_value=True)
         mock_card_2 = Mock()
         mock_card_2.account.balance = 0
         self.mock_card_data_base.get_card = MagicMock(return_value=mock_card_2)
-        with self.assertRaises(RecursionError):
-            self.logged_in_controller.main_loop()
+        self.mock_card_data_base.transfer = MagicMock(return_value=90)
+        self.logged_in_controller.main_loop()
+        self.mock_card_data_base.transfer.assert_called_once_with(self.mock_card.number, mock_card_2.number, 9)
+        self.assertEqual(90, self.mock_card.account.balance)
 
         self.assertTrue(
             "\nTransfer\n" +
@@ -341,9 +321,25 @@ class TestLoggedInController(TestPage):
             in self.captured_output.getvalue()
         )
 
+    def test_main_transfer_money_not_enough(self):
+        self.script('3', '4000001111111112', '100', '5')
+        self.mock_card_factory.is_valid = MagicMock(return_value=True)
+        self.mock_card_data_base.get_card = MagicMock(return_value=Mock())
+        self.mock_card_data_base.transfer = MagicMock(side_effect=ValueError)
+        self.logged_in_controller.main_loop()
+
+        self.assertTrue(
+            "Not enough money!"
+            in self.captured_output.getvalue()
+        )
+        self.assertFalse(
+            "Success!"
+            in self.captured_output.getvalue()
+        )
+        self.assertEqual(99, self.mock_card.account.balance)
+
     def test_main_loop_close_account(self):
-        global USER_INPUT
-        USER_INPUT = '4'
+        self.script('4')
         self.logged_in_controller.main_loop()
         self.assertTrue(
             "\nThe account has been closed!\n"
@@ -352,6 +348,106 @@ class TestLoggedInController(TestPage):
         self.assertFalse(self.logged_in_controller.is_over)
 
 
+class TestAsyncControllers(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.messages = []
+        self.questions = []
+        self.card_data_base = CardDataBase()
+        self.card_factory = CardFactory(self.card_data_base)
+
+        async def write(message):
+            self.messages.append(message)
+
+        async def ask(question):
+            self.questions.append(question)
+            await asyncio.sleep(0)
+            return next(self.user_inputs)
+
+        self.displayer = AsyncDisplayer(write)
+        self.retriever = AsyncRetriever(ask)
+
+        async def call(function, *arguments):
+            return function(*arguments)
+
+        self.call = call
+
+    async def test_main_loop_async(self):
+        card = self.card_factory.new_card()
+        self.user_inputs = iter(['7', '2', str(card.number), str(card.pin)])
+        logger = MagicMock()
+        logger.log_to = MagicMock(return_value=card)
+        main_menu_controller = MainMenuController(self.displayer, self.retriever, self.card_factory, logger)
+
+        self.assertIs(card, await main_menu_controller.main_loop_async(self.call))
+        logger.log_to.assert_called_once_with(card.number, card.pin)
+        self.assertEqual(["\nYou have successfully logged in!"], self.messages)
+        self.assertEqual(2, self.questions.count(main_menu_controller.choices_message()))
+
+    async def test_run_session_async(self):
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
+        self.card_factory = CardFactory(self.card_data_base)
+        target = self.card_factory.new_card()
+        calls = []
+
+        async def call(function, *arguments):
+            calls.append(function.__name__)
+            return function(*arguments)
+
+        self.user_inputs = iter(['1', '2', '4000000000000028', '0000', '2', '50', '3', str(target.number), '20', '1', '0'])
+        with patch('random.choice', return_value=0):
+            await run_session_async(
+                self.displayer, self.retriever, self.card_data_base, self.card_factory, Logger(self.card_data_base), call
+            )
+
+        self.assertIn("Success!", self.messages)
+        self.assertIn("\nBalance: 30", self.messages)
+        self.assertEqual(20, self.card_data_base.get_card(target.number).account.balance)
+        self.assertEqual(['new_card', 'log_to', 'deposit', 'get_card', 'transfer'], calls)
+        self.assertEqual("Bye!", self.messages[-1])
+
+    async def test_call_is_required(self):
+        # No thread is guessed for the blocking calls: a connection opened on
+        # this thread would fail on any other one.
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
+        self.user_inputs = iter(['0'])
+        with self.assertRaises(TypeError):
+            await run_session_async(
+                self.displayer, self.retriever, self.card_data_base, self.card_factory, Logger(self.card_data_base)
+            )
+        self.assertEqual([], self.questions)
+
+
+class StackDepthDisplayer(Displayer):
+    def __init__(self):
+        self.messages = 0
+        self.stack_depths = set()
+
+    def display(self, message):
+        self.messages += 1
+        if self.messages % 100_000 == 1:
+            frame, depth = sys._getframe(), 0
+            while frame is not None:
+                frame, depth = frame.f_back, depth + 1
+            self.stack_depths.add(depth)
+
+
+class TestLongSession(unittest.TestCase):
+    def test_scripted_actions_do_not_grow_stack(self):
+        card_data_base = CardDataBase()
+        card_factory = CardFactory(card_data_base)
+        card = card_factory.new_card()
+        user_inputs = itertools.chain(itertools.repeat('1', 1_000_000), ['0'])
+        displayer = StackDepthDisplayer()
+        retriever = Retriever(lambda question: next(user_inputs))
+
+        logged_in_controller = LoggedInController(displayer, retriever, card, card_data_base, card_factory)
+        logged_in_controller.main_loop()
+
+        self.assertTrue(logged_in_controller.is_over)
+        self.assertEqual(1_000_001, displayer.messages)
+        self.assertEqual(1, len(displayer.stack_depths))
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -1,8 +1,16 @@
 import unittest
 import _context
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 from unittest.mock import patch, MagicMock
 from banking.banking_model import Card, CardDataBase, CardFactory\
-    , Account, Logger, CardDataBaseSqlite3
+    , Account, Logger, CardDataBaseSqlite3, LedgerSettler, CardDataBaseSqlite3Pool\
+    , CachedCardDataBase, CardTable, CardSnapshot, ShardedCardDataBase, InstrumentedCardDataBase
 
 
 class TestAccount(unittest.TestCase):
@@ -68,6 +76,38 @@ class TestCard(unittest.TestCase):
         self.assertEqual(8641, self.card.pin)
 
 
+class TestCardTable(unittest.TestCase):
+    def setUp(self):
+        self.cards = [Card(4000_0000_0000_0010, 1234), Card(4000_0000_0000_0028, 42)]
+        self.cards[1].account.deposit(100)
+        self.card_table = CardTable(self.cards)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.cards[0], '__dict__'))
+        self.assertFalse(hasattr(self.cards[0].account, '__dict__'))
+
+    def test_rows(self):
+        self.assertEqual(2, len(self.card_table))
+        self.assertEqual(
+            [(card.number, card.pin, card.account.balance) for card in self.cards],
+            [(row.number, row.pin, row.balance) for row in self.card_table]
+        )
+        self.assertEqual(2, self.card_table[-1].get_customer_account_number())
+        with self.assertRaises(IndexError):
+            self.card_table[2]
+
+    def test_row_writes_into_table(self):
+        self.card_table[0].balance += 5
+        self.assertEqual(5, self.card_table.balances[0])
+
+    def test_to_cards(self):
+        card = list(self.card_table.to_cards())[1]
+        self.assertEqual((self.cards[1].number, 42, 100), (card.number, card.pin, card.account.balance))
+
+    def test_memory_size(self):
+        self.assertEqual(48, self.card_table.get_memory_size())
+
+
 class TestCardFactory(unittest.TestCase):
     def setUp(self):
         card_data_base = CardDataBase()
@@ -98,6 +138,117 @@ class TestCardFactory(unittest.TestCase):
         self.assertFalse(self.card_factory.is_valid(4000_0049_3832_0897))
 
 
+def string_compute_check_sum(issuer_identification_number, customer_id):
+    initial_number = str(issuer_identification_number) + str(customer_id).zfill(9)
+    sum = 0
+    for i, digit in enumerate(initial_number):
+        double = 2 * int(digit) if i % 2 == 0 else int(digit)
+        sum += double - 9 if double >= 10 else double
+
+    return (10 - sum % 10) % 10
+
+
+def string_is_valid(number):
+    check_sum = string_compute_check_sum(int(str(number)[:6]), int(str(number)[6:-1]))
+    return check_sum == int(str(number)[-1])
+
+
+class TestCardFactoryIntegerLuhn(unittest.TestCase):
+    def setUp(self):
+        self.card_factory = CardFactory(CardDataBase())
+
+    def test_compute_check_sum(self):
+        for customer_id in random.sample(range(10**9), 10_000):
+            self.assertEqual(
+                string_compute_check_sum(400000, customer_id),
+                self.card_factory.compute_check_sum(400000, customer_id)
+            )
+
+    def test_is_valid(self):
+        numbers = [random.randrange(10**15, 10**16) for _ in range(10_000)]
+        numbers += [self.card_factory.new_card().number for _ in range(100)]
+        for number in numbers:
+            self.assertEqual(string_is_valid(number), self.card_factory.is_valid(number))
+
+    def test_new_card(self):
+        card = self.card_factory.new_card()
+        self.assertEqual(4000_0000_0000_0010, card.number)
+        self.assertEqual(1, card.get_customer_account_number())
+        self.assertEqual(400000, card.get_issuer_identification_number())
+        self.assertEqual(0, card.get_checksum())
+
+
+class TestCardFactoryBatchLuhn(unittest.TestCase):
+    def setUp(self):
+        self.card_factory = CardFactory(CardDataBase())
+
+    def test_check_digits_many(self):
+        self.assertEqual([3, 6], self.card_factory.check_digits_many([400000_844943340, 400000_493832089]))
+
+        customer_ids = random.sample(range(10**9), 10_000)
+        prefixes = [400000 * 10**9 + customer_id for customer_id in customer_ids]
+        self.assertEqual(
+            [self.card_factory.compute_check_sum(400000, customer_id) for customer_id in customer_ids],
+            self.card_factory.check_digits_many(prefixes)
+        )
+
+    def test_is_valid_many(self):
+        numbers = [random.randrange(10**15, 10**16) for _ in range(10_000)]
+        numbers += [card.number for card in CardFactory(CardDataBaseSqlite3(':memory:')).new_cards(1_000)]
+        self.assertEqual(
+            [self.card_factory.is_valid(number) for number in numbers],
+            self.card_factory.is_valid_many(numbers)
+        )
+
+    def test_is_valid_many_rejects_other_lengths(self):
+        self.assertEqual(
+            [True, False, False, False],
+            self.card_factory.is_valid_many([4000_0084_4943_3403, 4010_00849_3832_0896, 0, 4000_0084_4943_340])
+        )
+
+
+class TestCardFactoryBulkIssuance(unittest.TestCase):
+    def setUp(self):
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
+        self.card_factory = CardFactory(self.card_data_base)
+
+    def test_new_cards(self):
+        cards = list(self.card_factory.new_cards(1000))
+        self.assertEqual(1000, len(cards))
+        self.assertEqual(list(range(1, 1001)), [card.get_customer_account_number() for card in cards])
+        for card in cards:
+            self.assertTrue(self.card_factory.is_valid(card.number))
+            self.assertGreaterEqual(9999, card.pin)
+            self.assertLessEqual(0000, card.pin)
+
+        self.assertEqual(cards[-1].number, self.card_data_base.get_last_emitted_card().number)
+        self.assertEqual(cards[500].pin, self.card_data_base.get_card(cards[500].number).pin)
+        self.assertEqual(1001, self.card_factory.new_card().get_customer_account_number())
+
+    def test_new_cards_already_in_database(self):
+        self.card_data_base.add_card(Card(4000_0000_0000_0010, 0))
+        with self.assertRaises(ValueError):
+            self.card_data_base.add_cards([Card(4000_0000_0000_0101, 0), Card(4000_0000_0000_0010, 0)])
+
+        self.assertEqual(4000_0000_0000_0010, self.card_data_base.get_last_emitted_card().number)
+
+    def test_removed_number_is_not_reissued(self):
+        first, second = self.card_factory.new_cards(2)
+        self.card_data_base.remove_card(second)
+        self.assertEqual(3, self.card_factory.new_card().get_customer_account_number())
+
+    def test_new_card_after_import_out_of_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cards.jsonl')
+            with open(path, 'w') as file:
+                for number in (4000_0000_0000_0101, 4000_0000_0000_0010):
+                    file.write('{"number": %d, "pin": "0000", "balance": 0}\n' % number)
+            self.card_data_base.import_cards(path)
+
+        self.assertEqual(11, self.card_factory.new_card().get_customer_account_number())
+        self.assertEqual(12, self.card_factory.new_card().get_customer_account_number())
+
+
 class TestCardDataBase(unittest.TestCase):
     def setUp(self):
         self.card_data_base = CardDataBase()
@@ -136,11 +287,73 @@ class TestCardDataBase(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.card_data_base.get_card(2)
 
+    def test_transfer(self):
+        card1 = Card(1, 2)
+        card2 = Card(3, 4)
+        card1.account.deposit(10)
+        self.card_data_base.add_card(card1)
+        self.card_data_base.add_card(card2)
+
+        self.assertEqual(3, self.card_data_base.transfer(1, 3, 7))
+        self.assertEqual(3, card1.account.balance)
+        self.assertEqual(7, card2.account.balance)
+
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(1, 3, 4)
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(1, 5, 1)
+        self.assertEqual(3, card1.account.balance)
+
+    def test_duplicate_cards(self):
+        self.card_data_base.add_card(Card(1, 2))
+        with self.assertRaises(ValueError):
+            self.card_data_base.add_card(Card(1, 3))
+        with self.assertRaises(ValueError):
+            self.card_data_base.add_cards([Card(3, 4), Card(1, 5)])
+
+        self.assertEqual(2, self.card_data_base.get_card(1).pin)
+        with self.assertRaises(ValueError):
+            self.card_data_base.get_card(3)
+
+    def test_last_emitted_card_after_bulk_add(self):
+        self.card_data_base.add_cards([Card(1, 2), Card(3, 4), Card(5, 6)])
+        self.assertEqual(5, self.card_data_base.get_last_emitted_card().number)
+
+    def test_last_emitted_card_is_kept_after_removal(self):
+        card_factory = CardFactory(self.card_data_base)
+        card_factory.new_card()
+        self.card_data_base.remove_card(card_factory.new_card())
+        self.assertEqual(3, card_factory.new_card().get_customer_account_number())
+
+    def test_update_card(self):
+        card1 = Card(1, 2)
+        self.card_data_base.add_card(card1)
+        card = Card(1, 7)
+        card.account.deposit(10)
+        self.card_data_base.update_card(card)
+        self.card_data_base.update_card(Card(3, 4))
+
+        self.assertIs(card1, self.card_data_base.get_card(1))
+        self.assertEqual(7, card1.pin)
+        self.assertEqual(10, card1.account.balance)
+        self.assertFalse(self.card_data_base.is_card(Card(3, 4)))
+
+    def test_remove_card(self):
+        card1 = Card(1, 2)
+        self.card_data_base.add_card(card1)
+        self.card_data_base.remove_card(Card(1, 3))
+        self.assertTrue(self.card_data_base.is_card(card1))
+
+        self.card_data_base.remove_card(card1)
+        self.assertFalse(self.card_data_base.is_card(card1))
+        with self.assertRaises(ValueError):
+            self.card_data_base.get_card(1)
+
 
 class TestCardDataBaseSqlite3(unittest.TestCase):
     @patch('banking.banking_model.Card')
     def setUp(self, mock_card):
-        self.card_data_base = CardDataBaseSqlite3()
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
         self.mock_card = mock_card
         self.mock_card.number = 4000_0011_1111_1112
         self.mock_card.pin = 0000
@@ -159,13 +372,37 @@ class TestCardDataBaseSqlite3(unittest.TestCase):
 
     def test_get_last_emitted_card(self):
         for num in range(1, 100):
-            self.mock_card.number = int('400000'+str(num).zfill(10))
+            self.mock_card.number = int('40000099'+str(num).zfill(8))
             self.mock_card.pin = int(str(num).zfill(4))
             self.mock_card.account.balance = 0
             self.card_data_base.add_card(self.mock_card)
             self.assertEqual(self.card_data_base.get_last_emitted_card().number, int(self.mock_card.number))
             self.assertEqual(self.card_data_base.get_last_emitted_card().pin, int(self.mock_card.pin))
 
+    def test_transfer(self):
+        target = Card(4000_0011_1111_1120, 1)
+        self.card_data_base.add_card(target)
+
+        self.assertEqual(4, self.card_data_base.transfer(self.mock_card.number, target.number, 6))
+        self.assertEqual(4, self.card_data_base.get_card(self.mock_card.number).account.balance)
+        self.assertEqual(6, self.card_data_base.get_card(target.number).account.balance)
+
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(self.mock_card.number, target.number, 5)
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(self.mock_card.number, target.number, -1)
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(self.mock_card.number, 4000_0000_0000_0000, 1)
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(4000_0000_0000_0000, target.number, 0)
+
+        self.assertEqual(4, self.card_data_base.get_card(self.mock_card.number).account.balance)
+        self.assertEqual(6, self.card_data_base.get_card(target.number).account.balance)
+
+    def test_get_card_parameters_are_not_sql(self):
+        with self.assertRaises(ValueError):
+            self.card_data_base.get_card("0 OR 1 = 1")
+
     def test_update_card(self):
         initial_balance = self.card_data_base.get_card(self.mock_card.number).account.balance
         self.mock_card.account.balance = initial_balance + 10
@@ -175,6 +412,798 @@ class TestCardDataBaseSqlite3(unittest.TestCase):
         self.assertEqual(initial_balance, final_balance - 10)
 
 
+class TestEmptyCardDataBaseSqlite3(unittest.TestCase):
+    def setUp(self):
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
+
+    def test_get_last_emitted_card(self):
+        card = self.card_data_base.get_last_emitted_card()
+        self.assertEqual(4000_0000_0000_0000, card.number)
+        self.assertEqual(0, card.account.balance)
+
+
+class TestCardDataBaseSqlite3Migration(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'card.s3db')
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            "CREATE TABLE card(\n" +
+            "   id INTEGER,\n" +
+            "   number TEXT,\n" +
+            "   pin TEXT,\n" +
+            "   balance INTEGER DEFAULT 0\n" +
+            ")"
+        )
+        connection.executemany(
+            "INSERT INTO card (number, pin, balance) VALUES (?, ?, ?)",
+            [(4000_0000_0000_0018, 1, 10), (4000_0000_0000_0026, 2, 20), (4000_0000_0000_0018, 1, 30)]
+        )
+        connection.commit()
+        connection.close()
+
+    def tearDown(self):
+        self.card_data_base.connection.close()
+        self.directory.cleanup()
+
+    def test_upgrade_legacy_file(self):
+        self.card_data_base = CardDataBaseSqlite3(self.path)
+        self.assertEqual(3, self.card_data_base.get_schema_version())
+
+        self.assertEqual(30, self.card_data_base.get_card(4000_0000_0000_0018).account.balance)
+        self.assertEqual(20, self.card_data_base.get_card(4000_0000_0000_0026).account.balance)
+        self.assertEqual(4000_0000_0000_0026, self.card_data_base.get_last_emitted_card().number)
+
+        self.card_data_base.cursor.execute("SELECT id FROM card ORDER BY id")
+        self.assertEqual([(2,), (3,)], self.card_data_base.cursor.fetchall())
+
+        self.card_data_base.cursor.execute("EXPLAIN QUERY PLAN SELECT * FROM card WHERE number = 4000000000000026")
+        self.assertIn('card_number', self.card_data_base.cursor.fetchone()[-1])
+
+        with self.assertRaises(ValueError):
+            self.card_data_base.add_card(Card(4000_0000_0000_0026, 2))
+
+    def test_reopen_upgraded_file(self):
+        CardDataBaseSqlite3(self.path).connection.close()
+        self.card_data_base = CardDataBaseSqlite3(self.path)
+        self.assertEqual(3, self.card_data_base.get_schema_version())
+        self.assertEqual(20, self.card_data_base.get_card(4000_0000_0000_0026).account.balance)
+
+    def test_file_migrated_by_another_connection(self):
+        # Both saw version 0 before taking the write lock; the other one migrated first.
+        CardDataBaseSqlite3(self.path).connection.close()
+        with patch.object(CardDataBaseSqlite3, 'get_schema_version', side_effect=[0, 3, 3]):
+            self.card_data_base = CardDataBaseSqlite3(self.path)
+        self.assertEqual(3, self.card_data_base.get_schema_version())
+        self.assertEqual(30, self.card_data_base.get_card(4000_0000_0000_0018).account.balance)
+
+
+class TestCardDataBaseSqlite3Ledger(unittest.TestCase):
+    def setUp(self):
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
+        self.first, self.second = CardFactory(self.card_data_base).new_cards(2)
+
+    def test_deposit(self):
+        self.assertEqual(50, self.card_data_base.deposit(self.first.number, 50))
+        self.assertEqual(75, self.card_data_base.deposit(self.first.number, 25))
+        self.assertEqual(
+            [(25, 75, None), (50, 50, None)],
+            [row[:3] for row in self.card_data_base.get_history(self.first.number)]
+        )
+
+        with self.assertRaises(ValueError):
+            self.card_data_base.deposit(self.first.number, -1)
+        with self.assertRaises(ValueError):
+            self.card_data_base.deposit(4000_0000_0000_0000, 1)
+        self.assertEqual(2, len(self.card_data_base.get_history(self.first.number)))
+
+    def test_transfer(self):
+        self.card_data_base.deposit(self.first.number, 50)
+        self.card_data_base.transfer(self.first.number, self.second.number, 20)
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(self.first.number, self.second.number, 31)
+
+        self.assertEqual((-20, 30, self.second.number), self.card_data_base.get_history(self.first.number)[0][:3])
+        self.assertEqual([(20, 20, self.first.number)], [row[:3] for row in self.card_data_base.get_history(self.second.number)])
+
+    def test_balance_deltas_and_updates(self):
+        self.card_data_base.apply_balance_deltas({self.first.number: 10, self.second.number: 5})
+        card = self.card_data_base.get_card(self.first.number)
+        card.account.balance = 4
+        self.card_data_base.update_card(card)
+        card.pin = 1
+        self.card_data_base.update_card(card)
+
+        self.assertEqual([(-6, 4), (10, 10)], [row[:2] for row in self.card_data_base.get_history(self.first.number)])
+        self.assertEqual([(5, 5)], [row[:2] for row in self.card_data_base.get_history(self.second.number)])
+
+    def test_recent_history(self):
+        for amount in range(1, 21):
+            self.card_data_base.deposit(self.first.number, amount)
+        self.assertEqual([20, 19, 18], [row[0] for row in self.card_data_base.get_history(self.first.number, 3)])
+
+        self.card_data_base.cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM transactions WHERE number = ? ORDER BY id DESC LIMIT 3",
+            (self.first.number,)
+        )
+        self.assertIn('transactions_number', self.card_data_base.cursor.fetchone()[-1])
+
+
+class TestCardDataBaseSqlite3ExportImport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
+        self.cards = list(CardFactory(self.card_data_base).new_cards(5))
+        self.card_data_base.apply_balance_deltas({self.cards[0].number: 100})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def assert_round_trip(self, name):
+        self.assertEqual(5, self.card_data_base.export_cards(self.get_path(name), batch_size=2))
+        card_data_base = CardDataBaseSqlite3(':memory:')
+        self.assertEqual(5, card_data_base.import_cards(self.get_path(name), batch_size=2))
+
+        for card in self.cards:
+            imported = card_data_base.get_card(card.number)
+            self.assertEqual(card.pin, imported.pin)
+        self.assertEqual(100, card_data_base.get_card(self.cards[0].number).account.balance)
+        self.assertEqual(self.cards[-1].number, card_data_base.get_last_emitted_card().number)
+
+    def test_csv(self):
+        self.assert_round_trip('cards.csv')
+        with open(self.get_path('cards.csv')) as file:
+            self.assertEqual('number,pin,balance', file.readline().strip())
+
+    def test_jsonl(self):
+        self.assert_round_trip('cards.jsonl')
+
+    def test_invalid_number_imports_nothing(self):
+        with open(self.get_path('cards.csv'), 'w') as file:
+            file.write('number,pin,balance\n4000000000000010,1234,0\n4000000000000011,1234,0\n')
+
+        card_data_base = CardDataBaseSqlite3(':memory:')
+        with self.assertRaises(ValueError):
+            card_data_base.import_cards(self.get_path('cards.csv'))
+        with self.assertRaises(ValueError):
+            card_data_base.get_card(4000_0000_0000_0010)
+
+    def test_duplicates(self):
+        self.card_data_base.export_cards(self.get_path('cards.jsonl'))
+        with self.assertRaises(ValueError):
+            self.card_data_base.import_cards(self.get_path('cards.jsonl'))
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            self.card_data_base.export_cards(self.get_path('cards.xml'))
+
+
+class TestCardSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cards.snapshot')
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
+        self.cards = list(CardFactory(self.card_data_base).new_cards(5))
+        self.card_data_base.apply_balance_deltas({self.cards[2].number: 100})
+        self.assertEqual(5, self.card_data_base.write_snapshot(self.path, batch_size=2))
+        self.snapshot = CardSnapshot(self.path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        self.directory.cleanup()
+
+    def test_get_card(self):
+        self.assertEqual(5, len(self.snapshot))
+        for card in self.cards:
+            self.assertEqual(card.pin, self.snapshot.get_card(card.number).pin)
+            self.assertTrue(self.snapshot.is_card(card))
+        self.assertEqual(100, self.snapshot.get_card(self.cards[2].number).account.balance)
+
+        with self.assertRaises(ValueError):
+            self.snapshot.get_card(4000_0000_0000_0000)
+        self.assertFalse(self.snapshot.is_card(Card(9999_9999_9999_9999, 0)))
+
+    def test_last_emitted_card(self):
+        self.assertEqual(self.cards[-1].number, self.snapshot.get_last_emitted_card().number)
+
+    def test_last_emitted_card_removed(self):
+        path = os.path.join(self.directory.name, 'removed.snapshot')
+        self.card_data_base.remove_card(self.cards[-1])
+        self.card_data_base.write_snapshot(path)
+        snapshot = CardSnapshot(path)
+        self.assertEqual(self.cards[-1].number, snapshot.get_last_emitted_card().number)
+        snapshot.close()
+
+    def test_get_balances(self):
+        balances = self.snapshot.get_balances([self.cards[2].number, self.cards[3].number, 4000_0000_0000_0000])
+        self.assertEqual({self.cards[2].number: 100, self.cards[3].number: 0}, balances)
+
+    def test_load(self):
+        card_data_base = CardDataBase()
+        card_data_base.add_cards(self.snapshot.to_cards())
+        self.assertEqual(self.cards[3].pin, card_data_base.get_card(self.cards[3].number).pin)
+
+        card_table = self.snapshot.to_card_table()
+        self.assertEqual([card.number for card in self.cards], list(card_table.numbers))
+        self.assertEqual(100, card_table.balances[2])
+
+    def test_empty_snapshot(self):
+        path = os.path.join(self.directory.name, 'empty.snapshot')
+        self.assertEqual(0, CardDataBaseSqlite3(':memory:').write_snapshot(path))
+        snapshot = CardSnapshot(path)
+        self.assertEqual(4000_0000_0000_0000, snapshot.get_last_emitted_card().number)
+        with self.assertRaises(ValueError):
+            snapshot.get_card(self.cards[0].number)
+        snapshot.close()
+
+    def test_not_a_snapshot(self):
+        path = os.path.join(self.directory.name, 'cards.csv')
+        self.card_data_base.export_cards(path)
+        with self.assertRaises(ValueError):
+            CardSnapshot(path)
+
+    def test_other_byte_order(self):
+        with open(self.path, 'r+b') as file:
+            file.seek(8)
+            file.write(b'big\0\0\0\0\0' if sys.byteorder == 'little' else b'little\0\0')
+        with self.assertRaises(ValueError):
+            CardSnapshot(self.path)
+
+
+class TestCardDataBaseSqlite3GroupCommit(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'card.s3db')
+        self.card_data_base = CardDataBaseSqlite3(self.path, commit_every=3, synchronous='normal')
+        self.reader = CardDataBaseSqlite3(self.path)
+
+    def tearDown(self):
+        self.card_data_base.close()
+        self.reader.close()
+        self.directory.cleanup()
+
+    def test_commit_every(self):
+        self.card_data_base.add_card(Card(4000_0000_0000_0010, 1))
+        self.card_data_base.add_card(Card(4000_0000_0000_0028, 2))
+        with self.assertRaises(ValueError):
+            self.reader.get_card(4000_0000_0000_0010)
+        self.assertEqual(2, self.card_data_base.get_card(4000_0000_0000_0028).pin)
+
+        self.card_data_base.add_card(Card(4000_0000_0000_0036, 3))
+        self.assertEqual(1, self.reader.get_card(4000_0000_0000_0010).pin)
+        self.assertEqual(3, self.reader.get_card(4000_0000_0000_0036).pin)
+
+    def test_flush(self):
+        self.card_data_base.add_card(Card(4000_0000_0000_0010, 1))
+        self.card_data_base.flush()
+        self.assertEqual(1, self.reader.get_card(4000_0000_0000_0010).pin)
+
+    def test_commit_interval(self):
+        self.card_data_base.commit_interval = 0
+        self.card_data_base.add_card(Card(4000_0000_0000_0010, 1))
+        self.assertEqual(1, self.reader.get_card(4000_0000_0000_0010).pin)
+
+    def test_commit_interval_alone(self):
+        card_data_base = CardDataBaseSqlite3(self.path, commit_interval=60)
+        for number in (4000_0000_0000_0010, 4000_0000_0000_0028, 4000_0000_0000_0036):
+            card_data_base.add_card(Card(number, 1))
+        with self.assertRaises(ValueError):
+            self.reader.get_card(4000_0000_0000_0010)
+
+        card_data_base.close()
+        self.assertEqual(1, self.reader.get_card(4000_0000_0000_0036).pin)
+
+    def test_timer_commits_the_tail_of_a_burst(self):
+        card_data_base = CardDataBaseSqlite3(self.path, commit_every=100, commit_interval=0.5)
+        card_data_base.last_commit = time.monotonic()
+        card_data_base.add_card(Card(4000_0000_0000_0010, 1))
+        timer = card_data_base.flush_timer
+        self.assertIsNotNone(timer)
+        timer.join(5)
+        self.assertFalse(card_data_base.connection.in_transaction)
+        self.assertEqual(1, self.reader.get_card(4000_0000_0000_0010).pin)
+        card_data_base.close()
+
+    def test_failed_batch_keeps_pending_writes(self):
+        self.card_data_base.add_card(Card(4000_0000_0000_0010, 1))
+        with self.assertRaises(ValueError):
+            self.card_data_base.add_cards([Card(4000_0000_0000_0028, 2), Card(4000_0000_0000_0010, 1)])
+
+        self.card_data_base.flush()
+        self.assertEqual(1, self.reader.get_card(4000_0000_0000_0010).pin)
+        with self.assertRaises(ValueError):
+            self.reader.get_card(4000_0000_0000_0028)
+
+    def test_failed_write_releases_lock(self):
+        self.reader.add_card(Card(4000_0000_0000_0010, 1))
+        self.reader.add_card(Card(4000_0000_0000_0028, 2))
+        with self.assertRaises(ValueError):
+            self.reader.transfer(4000_0000_0000_0010, 4000_0000_0000_0028, 1)
+        self.assertFalse(self.reader.connection.in_transaction)
+        with self.assertRaises(ValueError):
+            self.reader.add_card(Card(4000_0000_0000_0028, 3))
+        self.assertFalse(self.reader.connection.in_transaction)
+
+        connection = sqlite3.connect(self.path, timeout=0)
+        connection.execute("UPDATE card SET balance = 5 WHERE number = '4000000000000010'")
+        connection.commit()
+        connection.close()
+        self.assertEqual(5, self.reader.get_card(4000_0000_0000_0010).account.balance)
+
+    def test_invalid_synchronous(self):
+        with self.assertRaises(ValueError):
+            self.card_data_base.set_synchronous('sometimes')
+
+
+class TestCardDataBaseSqlite3Profile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'card.s3db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_default_profile(self):
+        card_data_base = CardDataBaseSqlite3(self.path)
+        self.assertEqual('delete', card_data_base.get_pragma('journal_mode'))
+        card_data_base.close()
+
+    def test_fast_profile(self):
+        card_data_base = CardDataBaseSqlite3(self.path, profile='fast')
+        self.assertEqual('wal', card_data_base.get_pragma('journal_mode'))
+        self.assertEqual(1, card_data_base.get_pragma('synchronous'))
+        self.assertEqual(2, card_data_base.get_pragma('temp_store'))
+        self.assertEqual(-64 * 1024, card_data_base.get_pragma('cache_size'))
+        card_data_base.add_card(Card(4000_0000_0000_0010, 1))
+        self.assertEqual(1, card_data_base.get_card(4000_0000_0000_0010).pin)
+        card_data_base.close()
+
+    def test_synchronous_overrides_profile(self):
+        card_data_base = CardDataBaseSqlite3(self.path, profile='wal', synchronous='FULL')
+        self.assertEqual(2, card_data_base.get_pragma('synchronous'))
+        card_data_base.close()
+
+    def test_custom_profile(self):
+        card_data_base = CardDataBaseSqlite3(self.path, profile={'cache_size': -1024})
+        self.assertEqual(-1024, card_data_base.get_pragma('cache_size'))
+        card_data_base.close()
+
+    def test_invalid_profile(self):
+        with self.assertRaises(ValueError):
+            CardDataBaseSqlite3(self.path, profile='reckless')
+        with self.assertRaises(ValueError):
+            CardDataBaseSqlite3(self.path, profile={'foreign_keys': 'ON'})
+        with self.assertRaises(ValueError):
+            CardDataBaseSqlite3(self.path, profile={'cache_size': '1; DROP TABLE card'})
+
+
+class TestCardDataBaseSqlite3Pool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.card_data_base = CardDataBaseSqlite3Pool(os.path.join(self.directory.name, 'card.s3db'))
+        self.card_factory = CardFactory(self.card_data_base)
+
+    def tearDown(self):
+        self.card_data_base.close()
+        self.directory.cleanup()
+
+    def run_threads(self, target, count=8):
+        errors = []
+
+        def run():
+            try:
+                target()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+
+    def test_concurrent_new_cards(self):
+        numbers = []
+        self.run_threads(lambda: numbers.extend(self.card_factory.new_card().number for _ in range(25)))
+        self.assertEqual(200, len(set(numbers)))
+        for number in numbers:
+            self.assertEqual(number, self.card_data_base.get_card(number).number)
+
+    def test_readers_see_writes(self):
+        first, second = self.card_factory.new_cards(2)
+        self.card_data_base.apply_balance_deltas({first.number: 100})
+        self.card_data_base.transfer(first.number, second.number, 40)
+
+        balances = []
+        self.run_threads(lambda: balances.append(self.card_data_base.get_balances([first.number, second.number])))
+        self.assertEqual([{first.number: 60, second.number: 40}] * 8, balances)
+        self.assertEqual(8, len(self.card_data_base.readers))
+
+    def test_group_commit_allocation(self):
+        self.card_data_base.close()
+        self.card_data_base = CardDataBaseSqlite3Pool(
+            os.path.join(self.directory.name, 'card.s3db'), commit_every=100
+        )
+        self.card_factory = CardFactory(self.card_data_base)
+        first = self.card_factory.new_card()
+        second = self.card_factory.new_card()
+        self.assertEqual(first.get_customer_account_number() + 1, second.get_customer_account_number())
+
+        with self.assertRaises(ValueError):
+            self.card_data_base.get_card(second.number)
+        self.card_data_base.flush()
+        self.assertEqual(second.pin, self.card_data_base.get_card(second.number).pin)
+
+    def test_is_card(self):
+        card = self.card_factory.new_card()
+        self.assertTrue(self.card_data_base.is_card(card))
+        self.assertFalse(self.card_data_base.is_card(Card(4000_0000_0000_0000, 0)))
+
+    def test_memory_database(self):
+        with self.assertRaises(ValueError):
+            CardDataBaseSqlite3Pool(':memory:')
+
+    def test_durable_writes_are_committed_together(self):
+        path = os.path.join(self.directory.name, 'card.s3db')
+        self.card_data_base.close()
+        self.card_data_base = CardDataBaseSqlite3Pool(path, durable=True, commit_every=100)
+        cards = list(CardFactory(self.card_data_base).new_cards(4))
+        connection = sqlite3.connect(path)
+        self.assertEqual(4, connection.execute("SELECT COUNT(*) FROM card").fetchone()[0])
+
+        # Hold the writer until four deposits are queued: they then share one commit.
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        blocker = threading.Thread(target=self.card_data_base.write, args=(block,))
+        blocker.start()
+        self.assertTrue(started.wait(5))
+        depositors = [
+            threading.Thread(target=self.card_data_base.deposit, args=(card.number, 10)) for card in cards
+        ]
+        writer = self.card_data_base.writer
+        with patch.object(writer, 'flush', wraps=writer.flush) as flush:
+            for depositor in depositors:
+                depositor.start()
+            deadline = time.monotonic() + 5
+            while self.card_data_base.writes.qsize() < 4 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            release.set()
+            for thread in [blocker] + depositors:
+                thread.join()
+
+        flush.assert_called_once_with()
+        self.assertEqual(40, connection.execute("SELECT SUM(balance) FROM card").fetchone()[0])
+        connection.close()
+
+
+class TestShardedCardDataBase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = [os.path.join(self.directory.name, f'card_{index}.s3db') for index in range(3)]
+        self.card_data_base = ShardedCardDataBase(self.paths, shard_size=1_000)
+        self.card_factory = CardFactory(self.card_data_base)
+
+    def tearDown(self):
+        self.card_data_base.close()
+        self.directory.cleanup()
+
+    def test_allocation_round_robin(self):
+        cards = [self.card_factory.new_card() for _ in range(6)]
+        self.assertEqual([1, 1_000, 2_000, 2, 1_001, 2_001], [card.get_customer_account_number() for card in cards])
+        for card in cards:
+            self.assertTrue(self.card_factory.is_valid(card.number))
+            self.assertEqual(card.pin, self.card_data_base.get_card(card.number).pin)
+            self.assertEqual(card.pin, self.card_data_base.get_shard(card.number).get_card(card.number).pin)
+        self.assertEqual(cards[-1].number, self.card_data_base.get_last_emitted_card().number)
+
+    def test_bulk_allocation(self):
+        cards = list(self.card_factory.new_cards(3)) + list(self.card_factory.new_cards(2))
+        self.assertEqual([1, 2, 3, 1_000, 1_001], [card.get_customer_account_number() for card in cards])
+        self.assertEqual(
+            {card.number: 0 for card in cards}, self.card_data_base.get_balances(card.number for card in cards)
+        )
+
+    def test_full_shard(self):
+        card_data_base = ShardedCardDataBase([os.path.join(self.directory.name, 'small.s3db')], shard_size=3)
+        card_factory = CardFactory(card_data_base)
+        card_factory.new_card()
+        card_factory.new_card()
+        with self.assertRaises(ValueError):
+            card_factory.new_card()
+        card_data_base.close()
+
+    def test_full_shard_is_skipped(self):
+        paths = [os.path.join(self.directory.name, f'small_{index}.s3db') for index in range(2)]
+        card_data_base = ShardedCardDataBase(paths, shard_size=4)
+        card_factory = CardFactory(card_data_base)
+        cards = list(card_factory.new_cards(3)) + [card_factory.new_card(), card_factory.new_card()]
+        self.assertEqual([1, 2, 3, 4, 5], [card.get_customer_account_number() for card in cards])
+        self.assertEqual([6, 7], [card_factory.new_card().get_customer_account_number() for _ in range(2)])
+        with self.assertRaises(ValueError):
+            card_factory.new_card()
+        card_data_base.close()
+
+    def test_bulk_allocation_stays_within_locked_shards(self):
+        paths = [os.path.join(self.directory.name, f'small_{index}.s3db') for index in range(2)]
+        card_data_base = ShardedCardDataBase(paths, shard_size=5)
+        with patch.object(card_data_base, 'add_cards', wraps=card_data_base.add_cards) as add_cards:
+            cards = list(CardFactory(card_data_base).new_cards(8))
+
+        self.assertEqual(list(range(1, 9)), [card.get_customer_account_number() for card in cards])
+        self.assertEqual(
+            [{0}, {1}],
+            [{card_data_base.get_shard_index(card.number) for card in call.args[0]} for call in add_cards.call_args_list]
+        )
+        card_data_base.close()
+
+    def test_default_shard_size_covers_every_number(self):
+        card_data_base = ShardedCardDataBase(self.paths)
+        self.assertEqual(2, card_data_base.get_shard_index(4000_0099_9999_9991))
+        self.assertIs(card_data_base.shards[2], card_data_base.get_shard(4000_0099_9999_9991))
+        card_data_base.close()
+
+    def test_transfer(self):
+        first, second, third, fourth = [self.card_factory.new_card() for _ in range(4)]
+        self.card_data_base.deposit(first.number, 100)
+
+        self.assertEqual(70, self.card_data_base.transfer(first.number, second.number, 30))
+        self.assertEqual(60, self.card_data_base.transfer(first.number, fourth.number, 10))
+        self.assertEqual({first.number: 60, second.number: 30, fourth.number: 10},
+                         self.card_data_base.get_balances([first.number, second.number, fourth.number]))
+        self.assertEqual((-30, 70, second.number), self.card_data_base.get_history(first.number)[1][:3])
+
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(second.number, third.number, 31)
+
+    def test_failed_credit_is_refunded(self):
+        first = self.card_factory.new_card()
+        self.card_data_base.deposit(first.number, 100)
+        missing = (4000_00 * 10**9 + 1_500) * 10
+
+        with self.assertRaises(ValueError):
+            self.card_data_base.transfer(first.number, missing, 40)
+        self.assertEqual(100, self.card_data_base.get_card(first.number).account.balance)
+        self.assertEqual([40, -40, 100], [row[0] for row in self.card_data_base.get_history(first.number)])
+
+    def test_balance_deltas_across_shards(self):
+        first, second = self.card_factory.new_card(), self.card_factory.new_card()
+        self.card_data_base.apply_balance_deltas({first.number: 10, second.number: 5})
+        with self.assertRaises(ValueError):
+            self.card_data_base.apply_balance_deltas({first.number: -10, second.number: -6})
+        self.assertEqual({first.number: 10, second.number: 5},
+                         self.card_data_base.get_balances([first.number, second.number]))
+
+    def test_update_and_remove(self):
+        card = self.card_factory.new_card()
+        self.card_factory.new_card()
+        card.pin = 1
+        self.card_data_base.update_card(card)
+        self.assertEqual(1, self.card_data_base.get_card(card.number).pin)
+        self.card_data_base.remove_card(card)
+        self.assertFalse(self.card_data_base.is_card(card))
+
+    def test_concurrent_new_cards(self):
+        self.card_data_base.close()
+        self.card_data_base = ShardedCardDataBase(self.paths, shard_size=1_000, check_same_thread=False)
+        self.card_factory = CardFactory(self.card_data_base)
+        numbers = []
+
+        def issue():
+            numbers.extend(self.card_factory.new_card().number for _ in range(10))
+
+        threads = [threading.Thread(target=issue) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(30, len(set(numbers)))
+
+
+class TestCachedCardDataBase(unittest.TestCase):
+    def setUp(self):
+        self.backend = CardDataBaseSqlite3(':memory:')
+        self.card_data_base = CachedCardDataBase(self.backend, max_size=2)
+        self.card_factory = CardFactory(self.card_data_base)
+        self.first, self.second, self.third = self.card_factory.new_cards(3)
+
+    def test_read_through(self):
+        with patch.object(self.backend, 'get_card', wraps=self.backend.get_card) as get_card:
+            for _ in range(3):
+                self.assertEqual(self.first.pin, self.card_data_base.get_card(self.first.number).pin)
+        get_card.assert_called_once_with(self.first.number)
+        self.assertEqual(1, self.card_data_base.cache_info()['misses'])
+        self.assertEqual(2, self.card_data_base.cache_info()['hits'])
+
+    def test_missing_card_is_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.card_data_base.get_card(4000_0000_0000_0000)
+        self.assertEqual(0, self.card_data_base.cache_info()['size'])
+
+    def test_hit_returns_a_copy(self):
+        self.card_data_base.get_card(self.first.number).account.deposit(50)
+        self.assertEqual(0, self.card_data_base.get_card(self.first.number).account.balance)
+
+    def test_least_recently_used_eviction(self):
+        self.card_data_base.get_card(self.first.number)
+        self.card_data_base.get_card(self.second.number)
+        self.card_data_base.get_card(self.first.number)
+        self.card_data_base.get_card(self.third.number)
+        self.assertEqual([self.first.number, self.third.number], list(self.card_data_base.entries))
+        self.assertEqual(1, self.card_data_base.cache_info()['evictions'])
+
+    def test_ttl(self):
+        card_data_base = CachedCardDataBase(self.backend, ttl=10)
+        with patch('banking.banking_model.time.monotonic', return_value=100):
+            card_data_base.get_card(self.first.number)
+            card_data_base.get_card(self.first.number)
+        with patch('banking.banking_model.time.monotonic', return_value=111):
+            card_data_base.get_card(self.first.number)
+        self.assertEqual(2, card_data_base.cache_info()['misses'])
+
+    def test_writes_invalidate(self):
+        card = self.card_data_base.get_card(self.first.number)
+        card.account.deposit(100)
+        self.card_data_base.update_card(card)
+        self.assertEqual(100, self.card_data_base.get_card(self.first.number).account.balance)
+
+        self.card_data_base.get_card(self.second.number)
+        self.card_data_base.transfer(self.first.number, self.second.number, 30)
+        self.assertEqual(70, self.card_data_base.get_card(self.first.number).account.balance)
+        self.assertEqual(30, self.card_data_base.get_card(self.second.number).account.balance)
+
+        self.card_data_base.apply_balance_deltas({self.second.number: -30})
+        self.assertEqual(0, self.card_data_base.get_card(self.second.number).account.balance)
+
+        self.card_data_base.remove_card(self.second)
+        with self.assertRaises(ValueError):
+            self.card_data_base.get_card(self.second.number)
+
+    def test_miss_racing_a_write_is_not_cached(self):
+        backend = CardDataBase()
+        backend.add_card(Card(4000_0000_0000_0010, 1))
+        card_data_base = CachedCardDataBase(backend)
+        read, written = threading.Event(), threading.Event()
+
+        def get_card(number):
+            # Hand back the row as it was, then let the write finish before it is stored.
+            card = Card(number, 1)
+            card.account.balance = backend.cards[number].account.balance
+            read.set()
+            written.wait(5)
+            return card
+
+        with patch.object(backend, 'get_card', side_effect=get_card):
+            reader = threading.Thread(target=card_data_base.get_card, args=(4000_0000_0000_0010,))
+            reader.start()
+            read.wait(5)
+            written_card = Card(4000_0000_0000_0010, 1)
+            written_card.account.balance = 10
+            card_data_base.update_card(written_card)
+            written.set()
+            reader.join()
+
+        self.assertEqual(0, card_data_base.cache_info()['size'])
+        self.assertEqual(10, card_data_base.get_card(4000_0000_0000_0010).account.balance)
+
+    def test_delegates_to_backend(self):
+        self.assertEqual(self.third.number, self.card_data_base.get_last_emitted_card().number)
+        self.assertIs(self.backend.allocation_lock, self.card_data_base.allocation_lock)
+        self.assertEqual({self.first.number: 0}, self.card_data_base.get_balances([self.first.number]))
+
+
+class TestInstrumentedCardDataBase(unittest.TestCase):
+    def setUp(self):
+        self.backend = CardDataBaseSqlite3(':memory:')
+        self.card_data_base = InstrumentedCardDataBase(self.backend)
+        self.card_factory = CardFactory(self.card_data_base)
+
+    def test_counts(self):
+        card = self.card_factory.new_card()
+        for _ in range(3):
+            Logger(self.card_data_base).log_to(card.number, card.pin)
+        with self.assertRaises(ValueError):
+            self.card_data_base.get_card(4000_0000_0000_0000)
+
+        stats = self.card_data_base.stats()
+        self.assertEqual({'get_last_emitted_card', 'add_card', 'get_card'}, set(stats))
+        self.assertEqual(4, stats['get_card']['count'])
+        self.assertEqual(1, stats['get_card']['errors'])
+        self.assertEqual(4, sum(stats['get_card']['histogram'].values()))
+        self.assertLessEqual(stats['get_card']['p50_ms'], stats['get_card']['p99_ms'])
+        self.assertGreater(stats['get_card']['max_ms'], 0)
+
+    def test_delegates_to_backend(self):
+        self.assertIs(self.backend.allocation_lock, self.card_data_base.allocation_lock)
+        self.assertIs(self.card_data_base.get_card, self.card_data_base.get_card)
+        card = self.card_factory.new_card()
+        self.assertEqual(10, self.card_data_base.deposit(card.number, 10))
+
+    def test_percentiles(self):
+        with patch('banking.banking_model.time.perf_counter_ns', side_effect=[0, 1_000, 0, 1_000, 0, 1_000_000]):
+            for _ in range(3):
+                self.card_data_base.get_balances([])
+
+        stats = self.card_data_base.stats()['get_balances']
+        self.assertEqual(2**10 / 1e6, stats['p50_ms'])
+        self.assertEqual(2**20 / 1e6, stats['p99_ms'])
+        self.assertEqual(1, stats['max_ms'])
+
+    def test_periodic_summary(self):
+        summaries = []
+        card_data_base = InstrumentedCardDataBase(self.backend, summary_interval=10, summary_function=summaries.append)
+        with patch('banking.banking_model.time.monotonic', return_value=card_data_base.next_summary):
+            card_data_base.get_balances([])
+        card_data_base.get_balances([])
+
+        self.assertEqual(1, len(summaries))
+        self.assertIn('get_balances', summaries[0])
+
+    def test_reset(self):
+        self.card_data_base.get_balances([])
+        self.card_data_base.reset()
+        self.assertEqual({}, self.card_data_base.stats())
+
+
+class TestLedgerSettler(unittest.TestCase):
+    def setUp(self):
+        self.card_data_base = CardDataBaseSqlite3(':memory:')
+        self.card_factory = CardFactory(self.card_data_base)
+        self.settler = LedgerSettler(self.card_data_base, self.card_factory)
+        self.first, self.second, self.third = self.card_factory.new_cards(3)
+        self.card_data_base.apply_balance_deltas({self.first.number: 100})
+
+    def get_balance(self, card):
+        return self.card_data_base.get_card(card.number).account.balance
+
+    def test_settle(self):
+        failures = self.settler.settle([
+            (self.first.number, self.second.number, 60),
+            (self.second.number, self.third.number, 50),
+            (self.first.number, self.third.number, 40),
+            (self.third.number, self.first.number, 10),
+        ])
+        self.assertEqual([], failures)
+        self.assertEqual(10, self.get_balance(self.first))
+        self.assertEqual(10, self.get_balance(self.second))
+        self.assertEqual(80, self.get_balance(self.third))
+
+    def test_failures_do_not_abort_batch(self):
+        failures = self.settler.settle([
+            (self.first.number, self.second.number, 60),
+            (self.second.number, self.third.number, 61),
+            (self.first.number, 4000_0000_0000_0000, 1),
+            (self.first.number, 4000_0000_0000_0001, 1),
+            (self.first.number, self.third.number, -1),
+            (self.second.number, self.third.number, 20),
+        ])
+        self.assertEqual([1, 2, 3, 4], [index for index, transfer, reason in failures])
+        self.assertEqual((self.second.number, self.third.number, 61), failures[0][1])
+        self.assertEqual(40, self.get_balance(self.first))
+        self.assertEqual(40, self.get_balance(self.second))
+        self.assertEqual(20, self.get_balance(self.third))
+
+    def test_in_memory_backend(self):
+        card_data_base = CardDataBase()
+        first, second = Card(4000_0000_0000_0010, 0), Card(4000_0000_0000_0028, 0)
+        first.account.deposit(10)
+        card_data_base.add_cards([first, second])
+
+        settler = LedgerSettler(card_data_base, CardFactory(card_data_base))
+        failures = settler.settle([(first.number, second.number, 4), (first.number, second.number, 7)])
+        self.assertEqual([1], [index for index, transfer, reason in failures])
+        self.assertEqual(6, first.account.balance)
+        self.assertEqual(4, second.account.balance)
+
+
 class TestLogIn(unittest.TestCase):
     @patch('banking.banking_model.CardDataBase')
     def setUp(self, MockCardDataBase):
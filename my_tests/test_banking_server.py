@@ -0,0 +1,96 @@
+import _context
+import asyncio
+import re
+import unittest
+from banking.banking_server import BankingServer
+
+
+class TestBankingServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.banking_server = BankingServer(':memory:')
+        self.port = await self.banking_server.start(port=0)
+
+    async def asyncTearDown(self):
+        await self.banking_server.close()
+
+    async def open_client(self):
+        return await asyncio.open_connection('127.0.0.1', self.port)
+
+    async def answer(self, reader, writer, line):
+        output = (await reader.readuntil(b'> ')).decode()
+        writer.write(line.encode() + b'\n')
+        await writer.drain()
+        return output
+
+    async def test_session(self):
+        reader, writer = await self.open_client()
+        await self.answer(reader, writer, '1')
+        output = await self.answer(reader, writer, '2')
+        number = re.findall(r'^400000\d{10}$', output, re.MULTILINE)[0]
+        pin = re.findall(r'^\d{4}$', output, re.MULTILINE)[0]
+
+        await self.answer(reader, writer, number)
+        await self.answer(reader, writer, pin)
+        output = await self.answer(reader, writer, '1')
+        self.assertIn("You have successfully logged in!", output)
+
+        output = await self.answer(reader, writer, '0')
+        self.assertIn("Balance: 0", output)
+        self.assertIn("Bye!", (await reader.read()).decode())
+        writer.close()
+
+    async def test_concurrent_sessions(self):
+        async def create_account():
+            reader, writer = await self.open_client()
+            await self.answer(reader, writer, '1')
+            output = await self.answer(reader, writer, '0')
+            await reader.read()
+            writer.close()
+            return re.findall(r'400000\d{10}', output)[0]
+
+        numbers = await asyncio.gather(*(create_account() for _ in range(20)))
+        self.assertEqual(20, len(set(numbers)))
+
+    async def test_idle_client_does_not_block_others(self):
+        idle_reader, idle_writer = await self.open_client()
+        await idle_reader.readuntil(b'> ')
+
+        reader, writer = await self.open_client()
+        await self.answer(reader, writer, '1')
+        await self.answer(reader, writer, '0')
+        self.assertIn("Bye!", (await asyncio.wait_for(reader.read(), 5)).decode())
+        writer.close()
+        idle_writer.close()
+
+    async def test_client_disconnects(self):
+        reader, writer = await self.open_client()
+        await reader.readuntil(b'> ')
+        writer.close()
+        await writer.wait_closed()
+
+        reader, writer = await self.open_client()
+        await self.answer(reader, writer, '0')
+        self.assertIn("Bye!", (await reader.read()).decode())
+        writer.close()
+
+    async def test_max_sessions(self):
+        banking_server = BankingServer(':memory:', max_sessions=1)
+        self.port = await banking_server.start(port=0)
+        first_reader, first_writer = await self.open_client()
+        await first_reader.readuntil(b'> ')
+
+        reader, writer = await self.open_client()
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(reader.readuntil(b'> '), 0.2)
+
+        first_writer.write(b'0\n')
+        self.assertIn("Bye!", (await asyncio.wait_for(first_reader.read(), 5)).decode())
+        first_writer.close()
+        await asyncio.wait_for(self.answer(reader, writer, '0'), 5)
+        self.assertIn("Bye!", (await asyncio.wait_for(reader.read(), 5)).decode())
+        writer.close()
+        await banking_server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
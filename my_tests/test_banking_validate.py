@@ -0,0 +1,61 @@
+import _context
+import os
+import tempfile
+import unittest
+from banking.banking_model import CardDataBaseSqlite3, CardFactory
+from banking.banking_validate import validate_file
+
+
+class TestValidateFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database_path = self.get_path('card.s3db')
+        card_data_base = CardDataBaseSqlite3(self.database_path)
+        self.cards = list(CardFactory(card_data_base).new_cards(3))
+        card_data_base.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_validate_file(self):
+        lines = [
+            str(self.cards[0].number),
+            '4000000000000101',
+            str(self.cards[0].number + 1),
+            'not a number',
+            '',
+            str(self.cards[2].number),
+            '79927398713',
+        ]
+        with open(self.get_path('input.txt'), 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+        counts = validate_file(self.get_path('input.txt'), self.get_path('output.csv'), self.database_path, 2, 2)
+
+        self.assertEqual({'ok': 2, 'missing': 1, 'invalid': 4}, counts)
+        with open(self.get_path('output.csv')) as file:
+            self.assertEqual([
+                'number,status',
+                f'{self.cards[0].number},ok',
+                '4000000000000101,missing',
+                f'{self.cards[0].number + 1},invalid',
+                'not a number,invalid',
+                ',invalid',
+                f'{self.cards[2].number},ok',
+                '79927398713,invalid',
+            ], file.read().splitlines())
+
+    def test_database_is_read_only(self):
+        with open(self.get_path('input.txt'), 'w') as file:
+            file.write(f'{self.cards[1].number}\n')
+
+        modified = os.path.getmtime(self.database_path)
+        validate_file(self.get_path('input.txt'), self.get_path('output.csv'), self.database_path, 1)
+        self.assertEqual(modified, os.path.getmtime(self.database_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
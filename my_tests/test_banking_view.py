@@ -1,8 +1,11 @@
 import unittest
 import _context
+import json
+import os
 import sys
+import tempfile
 from io import StringIO
-from banking.banking_view import Displayer, Retriever
+from banking.banking_view import Displayer, Retriever, RecordingRetriever
 
 
 class TestPage(unittest.TestCase):
@@ -38,5 +41,25 @@ class TestRetriever(TestPage):
             self.captured_output.__init__()
 
 
+class TestRecordingRetriever(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'sessions.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_record_sessions(self):
+        for answers in (['1', '0'], ['2', '4000000000000010', '1234', '0']):
+            user_inputs = iter(answers)
+            retriever = RecordingRetriever(lambda question: next(user_inputs), self.path)
+            self.assertEqual(answers, [retriever.retrieve('?') for _ in answers])
+            retriever.save()
+
+        with open(self.path) as file:
+            sessions = [json.loads(line) for line in file]
+        self.assertEqual([{'inputs': ['1', '0']}, {'inputs': ['2', '4000000000000010', '1234', '0']}], sessions)
+
+
 if __name__ == '__main__':
     unittest.main()